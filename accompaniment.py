@@ -0,0 +1,106 @@
+"""
+Chord-following accompaniment realized over the song's bar grid
+"""
+import numpy as np
+import smf_writer
+from pattern_library import bar_ticks, tile_notes
+from chord_recognition import CHORD_QUALITIES
+from chord_symbols import pitch_class
+from music_theory import MODE_INTERVALS, DIATONIC_TRIADS
+
+QUALITY_INDEX = {quality: index for index, (quality, _) in enumerate(CHORD_QUALITIES)}
+
+# Semitones above the root of chord tones 0-3 for each quality; triads double the root an octave up
+CHORD_TONES = np.array([list(intervals) + [12] * (4 - len(intervals)) for _, intervals in CHORD_QUALITIES])
+
+# MIDI channel and program of each part (drums use the GM percussion channel)
+PARTS = {
+    'bass': (1, 32),
+    'drums': (9, None),
+    'chords': (2, 0),
+    'strings': (3, 48),  # String Ensemble 1
+    'lead': (4, 80),     # Square Lead
+    'pad': (5, 89),      # Warm Pad
+}
+
+# Largest random change to a note's velocity when a part is humanized
+HUMANIZE_VELOCITY = 6
+
+
+class Accompaniment:
+    """Key, meter, length and chord timeline of a song, against which every part is realized"""
+
+    def __init__(self, analysis, ticks_per_beat, patterns, genre='', length_ticks=None, chord_timeline=None):
+        self.ticks_per_beat = ticks_per_beat
+        self.patterns = patterns
+        self.genre = genre
+
+        key_info = analysis.get('key_signature', {})
+        song_key = key_info.get('key', 'C major').split()[0] if key_info.get('key') else 'C'
+        self.tonic = pitch_class(song_key) or 0
+        mode = key_info.get('mode', 'major')
+        self.mode = mode if mode in MODE_INTERVALS else 'major'
+
+        try:
+            numerator, denominator = (int(part) for part in analysis.get('rhythm_patterns', {}).get('time_signature', '4/4').split('/'))
+        except ValueError:
+            numerator, denominator = 4, 4
+        self.meter = (numerator, denominator)
+        self.bar_ticks = bar_ticks(ticks_per_beat, self.meter)
+
+        # The song's length, and the arrangement's when extended
+        self.song_ticks = max(int(analysis.get('basic_info', {}).get('duration_ticks', 0)), self.bar_ticks)
+        self.length_ticks = int(length_ticks or self.song_ticks)
+
+        timeline = chord_timeline or {}
+        self.chord_starts = np.asarray(timeline.get('beats', []), dtype=np.int64) * ticks_per_beat
+        self.chord_ids = np.asarray(timeline.get('chords', []), dtype=np.int64)
+
+        # The key's tonic triad stands in wherever no chord was recognized
+        tonic_quality = DIATONIC_TRIADS[self.mode][0]
+        self.default_chord = QUALITY_INDEX.get(tonic_quality, 0) * 12 + self.tonic
+
+    def chords_at(self, ticks):
+        """Chord id sounding at each tick of the song"""
+        ticks = np.asarray(ticks, dtype=np.int64)
+        if not len(self.chord_ids):
+            return np.full(len(ticks), self.default_chord, dtype=np.int64)
+        index = np.searchsorted(self.chord_starts, ticks, side='right') - 1
+        return np.where(index >= 0, self.chord_ids[np.maximum(index, 0)], self.default_chord)
+
+    def realize(self, part):
+        """(onsets, durations, pitches, velocities) of a part across the whole arrangement"""
+        template = self.patterns.get(part, self.genre, self.ticks_per_beat, self.meter)
+
+        # One pass over the song's bars...
+        notes = tile_notes(template, self.bar_ticks, -(-self.song_ticks // self.bar_ticks))
+        notes = notes[notes['onset'] < self.song_ticks]
+        notes['duration'] = np.minimum(notes['duration'], self.song_ticks - notes['onset'])
+
+        # Pitched notes take the root and chord tone of the chord at their onset,
+        # with roots above F# dropped an octave to stay near the template register
+        pitched = notes['tone'] >= 0
+        chord_ids = self.chords_at(notes['onset'][pitched])
+        roots = chord_ids % 12
+        pitches = notes['pitch'].astype(np.int64)
+        pitches[pitched] += np.where(roots > 6, roots - 12, roots) + CHORD_TONES[chord_ids // 12, notes['tone'][pitched]]
+        notes['pitch'] = np.clip(pitches, 0, 127)
+
+        # ...then whole-song loops, in step with the extended original tracks
+        notes = tile_notes(notes, self.song_ticks, -(-self.length_ticks // self.song_ticks))
+        notes = notes[notes['onset'] < self.length_ticks]
+        durations = np.minimum(notes['duration'], self.length_ticks - notes['onset'])
+
+        return notes['onset'], durations, notes['pitch'], notes['velocity']
+
+    def part_events(self, part, rng=None):
+        """Channel events of a part, ready for smf_writer.encode_track; an rng humanizes velocities"""
+        channel, program = PARTS[part]
+        onsets, durations, pitches, velocities = self.realize(part)
+        if rng is not None:
+            jitter = rng.integers(-HUMANIZE_VELOCITY, HUMANIZE_VELOCITY + 1, len(velocities))
+            velocities = np.clip(velocities.astype(np.int64) + jitter, 1, 127)
+        events = smf_writer.note_events(onsets, durations, pitches, velocities, channel)
+        if program is not None:
+            events = np.concatenate([smf_writer.program_change(channel, program), events])
+        return events
@@ -0,0 +1,174 @@
+"""
+Content-hash keyed cache for analysis results
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class AnalysisCache:
+    """LRU cache of JSON results bounded by entry count and size, with an optional disk tier bounded by size"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, cache_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def content_digest(data):
+        """SHA-256 hex digest of in-memory content"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def file_digest(filepath, block_size=1024 * 1024):
+        """SHA-256 hex digest of a file, read in blocks so large files are never fully loaded"""
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(digest, *parts):
+        """Build a cache key from a content digest plus any version/context parts"""
+        return '-'.join([digest] + [str(part) for part in parts])
+
+    def get(self, key):
+        """Return a fresh copy of the cached value, or None on a miss"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+
+        if payload is None:
+            payload = self._read_disk(key)
+            if payload is not None:
+                self._remember(key, payload)
+
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return json.loads(payload)
+
+    def put(self, key, value):
+        """Store a JSON-serializable value in memory and, if configured, on disk"""
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            print(f"Analysis cache skipped unserializable value: {e}")
+            return
+
+        self._remember(key, payload)
+        self._write_disk(key, payload)
+
+    def stats(self):
+        """Report cache occupancy and hit counts"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk': bool(self.cache_dir),
+                'disk_evictions': self.disk_evictions
+            }
+
+    def _remember(self, key, payload):
+        """Insert into the memory tier, evicting least recently used entries over budget"""
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+
+            self._entries[key] = payload
+            self._size += size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Analysis cache read error: {e}")
+            return None
+
+        # A hit counts as a use, so disk eviction removes the least recently used entries
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    def _write_disk(self, key, payload):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            # Atomic rename so concurrent readers never see a partial entry
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Analysis cache write error: {e}")
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        """Remove the least recently used disk entries until the directory fits max_disk_bytes"""
+        entries = []
+        with os.scandir(self.cache_dir) as listing:
+            for entry in listing:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Removed by another process since the listing
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Analysis cache delete error: {e}")
+                continue
+            total -= size
+            with self._lock:
+                self.disk_evictions += 1
@@ -0,0 +1,105 @@
+"""
+Process pool for running CPU-bound MIDI analysis outside the web workers' GIL
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _warm_worker(prewarm_music21=False):
+    """Pool initializer: pay the heavy imports once per worker process"""
+    import midi_analyzer  # noqa: F401
+    # Analysis does not use music21, so workers only load it when asked to
+    if prewarm_music21:
+        from midi_data import prewarm_music21
+        prewarm_music21()
+
+
+def _analyze_in_worker(data):
+    """Worker entry point; takes the uploaded bytes and returns a plain result dict"""
+    from midi_analyzer import MIDIAnalyzer
+    return MIDIAnalyzer().analyze_data(data)
+
+
+def _stream_analyze_in_worker(path):
+    """Worker entry point for large files: the worker reads the file itself, in constant memory"""
+    from streaming_analyzer import StreamingAnalyzer
+    return StreamingAnalyzer().analyze_file(path)
+
+
+class AnalysisPool:
+    """Warm worker processes for MIDIAnalyzer, recycled after a fixed number of jobs"""
+
+    def __init__(self, processes=None, max_tasks_per_worker=50, timeout=120, prewarm_music21=False):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.timeout = timeout
+        self.prewarm_music21 = prewarm_music21
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def analyze(self, data):
+        """Analyze MIDI bytes in a worker"""
+        return self.run(_analyze_in_worker, data)
+
+    def analyze_large_file(self, path):
+        """Analyze a MIDI file on disk with the streaming analyzer in a worker"""
+        return self.run(_stream_analyze_in_worker, path)
+
+    def run(self, function, *args, retries=1):
+        """Call a picklable function in a worker and return its result, or a failure dict if the worker dies or hangs"""
+        executor = self._get_executor()
+        try:
+            future = executor.submit(function, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Another job broke or discarded this pool between fetching and submitting
+            self._discard(executor)
+            if retries > 0:
+                return self.run(function, *args, retries=retries - 1)
+            return {'success': False, 'error': f'Analysis pool unavailable: {e}'}
+
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool as e:
+            # A worker died (crash or OOM kill). Never rerun here: the same input would take
+            # this process down too. One retry on a fresh pool covers jobs that were only
+            # in flight alongside the one that killed the worker.
+            print(f"Analysis worker died: {e}")
+            self._discard(executor)
+            if retries > 0:
+                return self.run(function, *args, retries=retries - 1)
+            return {'success': False, 'error': 'Analysis worker crashed while processing this file'}
+        except TimeoutError:
+            # cancel() cannot stop a task that is already running, so the hung worker is
+            # terminated with its pool; jobs sharing that pool are retried on the next one
+            self._discard(executor, terminate=True)
+            return {'success': False, 'error': f'Analysis timed out after {self.timeout} seconds'}
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_worker,
+                    initargs=(self.prewarm_music21,),
+                    max_tasks_per_child=self.max_tasks_per_worker
+                )
+            return self._executor
+
+    def _discard(self, executor, terminate=False):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        processes = list((executor._processes or {}).values()) if terminate else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        # shutdown() lets running tasks finish; a hung worker has to be stopped outright
+        for process in processes:
+            process.terminate()
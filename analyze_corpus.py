@@ -0,0 +1,364 @@
+"""
+Offline analysis of a directory of MIDI files on a process pool, with resumable incremental output
+
+Usage: python analyze_corpus.py CORPUS_DIR OUTPUT [--format jsonl|parquet] [--workers N] [--retry-failed]
+
+JSONL output is a single file with one record per line. Parquet output (needs pyarrow)
+is a directory of part files, each written once its batch of records is complete.
+Files whose content hash already has a record from the current analyzer version are
+skipped, so an interrupted run picks up where it stopped.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from analysis_cache import AnalysisCache
+from midi_analyzer import ANALYZER_VERSION
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+# Flat columns pulled out of each analysis for columnar output; the full analysis is kept as JSON
+SUMMARY_FIELDS = {
+    'tracks': ('basic_info', 'tracks'),
+    'length_seconds': ('basic_info', 'length_seconds'),
+    'key': ('key_signature', 'key'),
+    'average_bpm': ('tempo_info', 'average_bpm'),
+    'time_signature': ('rhythm_patterns', 'time_signature'),
+    'total_notes': ('notes_analysis', 'total_notes'),
+}
+
+# Parquet column types (pyarrow aliases), fixed so every part file shares one schema
+PARQUET_COLUMNS = (
+    ('digest', 'string'),
+    ('path', 'string'),
+    ('size', 'int64'),
+    ('analyzer_version', 'int64'),
+    ('success', 'bool'),
+    ('seconds', 'double'),
+    ('error', 'string'),
+    ('tracks', 'int64'),
+    ('length_seconds', 'double'),
+    ('key', 'string'),
+    ('average_bpm', 'double'),
+    ('time_signature', 'string'),
+    ('total_notes', 'int64'),
+    ('analysis', 'string'),
+)
+
+
+def _analyze_path(path, streaming_threshold):
+    """Worker entry point: analyze one file and return its record (without the digest)"""
+    from midi_analyzer import MIDIAnalyzer
+    from streaming_analyzer import StreamingAnalyzer
+
+    start = time.perf_counter()
+    if os.path.getsize(path) > streaming_threshold:
+        result = StreamingAnalyzer().analyze_file(path)
+    else:
+        result = MIDIAnalyzer().analyze_file(path)
+
+    record = {
+        'path': path,
+        'analyzer_version': ANALYZER_VERSION,
+        'success': result['success'],
+        'seconds': round(time.perf_counter() - start, 4),
+    }
+    if result['success']:
+        record['analysis'] = result['analysis']
+    else:
+        record['error'] = result['error']
+    return record
+
+
+def iter_corpus(root):
+    """Every MIDI file under root, in a stable order"""
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(MIDI_EXTENSIONS):
+                yield os.path.join(directory, filename)
+
+
+def summary_columns(record):
+    """Flat summary values of a record, None where the analysis lacks them"""
+    columns = {}
+    for name, (section, field) in SUMMARY_FIELDS.items():
+        columns[name] = record.get('analysis', {}).get(section, {}).get(field)
+    return columns
+
+
+class JSONLWriter:
+    """Appends one JSON record per line, flushed as it is written"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def completed_digests(self, skip_failed):
+        """Digests already recorded by this analyzer version"""
+        digests = set()
+        if not os.path.exists(self.path):
+            return digests
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interrupted run; that file is analyzed again
+                    continue
+                if record.get('analyzer_version') == ANALYZER_VERSION and (record.get('success') or skip_failed):
+                    digests.add(record['digest'])
+        return digests
+
+    def write(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._terminate_partial_line()
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def _terminate_partial_line(self):
+        """Start on a fresh line if an interrupted run left half a record at the end"""
+        if self._file.tell() == 0:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                self._file.write('\n')
+
+
+class ParquetWriter:
+    """Writes records in batches as numbered Parquet part files in a directory"""
+
+    def __init__(self, directory, batch_size=1000):
+        # pyarrow is optional; only this output format needs it
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.schema = pyarrow.schema([(name, pyarrow.type_for_alias(alias)) for name, alias in PARQUET_COLUMNS])
+        self.directory = directory
+        self.batch_size = batch_size
+        self._rows = []
+        os.makedirs(directory, exist_ok=True)
+
+    def completed_digests(self, skip_failed):
+        digests = set()
+        for path in self._part_paths():
+            table = self.parquet.read_table(path, columns=['digest', 'analyzer_version', 'success'])
+            for digest, version, success in zip(*(table.column(name).to_pylist() for name in table.column_names)):
+                if version == ANALYZER_VERSION and (success or skip_failed):
+                    digests.add(digest)
+        return digests
+
+    def write(self, record):
+        row = {
+            'digest': record['digest'],
+            'path': record['path'],
+            'size': record['size'],
+            'analyzer_version': record['analyzer_version'],
+            'success': record['success'],
+            'seconds': record['seconds'],
+            'error': record.get('error'),
+            **summary_columns(record),
+            'analysis': json.dumps(record['analysis']) if 'analysis' in record else None,
+        }
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+
+    def _part_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'part-*.parquet')))
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self.pyarrow.Table.from_pylist(self._rows, schema=self.schema)
+        path = os.path.join(self.directory, f'part-{len(self._part_paths()):05d}.parquet')
+        # Written under a temporary name so a crash never leaves a half-written part behind
+        self.parquet.write_table(table, f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
+        self._rows = []
+
+
+class Throughput:
+    """Running files/s and notes/s, reported at most every `interval` seconds"""
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.files = 0
+        self.failed = 0
+        self.skipped = 0
+        self.notes = 0
+
+    def add(self, record):
+        self.files += 1
+        if record['success']:
+            self.notes += summary_columns(record)['total_notes'] or 0
+        else:
+            self.failed += 1
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"{self.files} analyzed ({self.failed} failed), {self.skipped} skipped, "
+                f"{self.files / elapsed:.1f} files/s, {self.notes / elapsed:,.0f} notes/s, {elapsed:.1f} s")
+
+    def maybe_report(self):
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            print(self.line(), file=sys.stderr, flush=True)
+
+
+def _new_executor(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               max_tasks_per_child=200)
+
+
+def run(corpus, writer, workers, streaming_threshold, skip_failed, progress_interval):
+    """Analyze every new file of the corpus into the writer; returns the throughput counters"""
+    done = writer.completed_digests(skip_failed)
+    throughput = Throughput(progress_interval)
+    pending = {}
+    suspects = []
+    window = 2 * workers
+    executor = _new_executor(workers)
+
+    def write(item, record):
+        path, digest, size = item
+        record.update(digest=digest, size=size)
+        writer.write(record)
+        throughput.add(record)
+
+    def failure(item, error):
+        return {'path': item[0], 'analyzer_version': ANALYZER_VERSION, 'success': False, 'seconds': 0, 'error': error}
+
+    def collect(futures):
+        for future in futures:
+            item = pending.pop(future)
+            try:
+                record = future.result()
+            except BrokenProcessPool:
+                # A worker died, and every file in flight fails with it; the culprit is
+                # found by retrying them one at a time, so nothing is recorded yet
+                suspects.append(item)
+                continue
+            except Exception as e:
+                record = failure(item, f'Worker failed: {e}')
+            write(item, record)
+        throughput.maybe_report()
+
+    def recover():
+        """Replace a broken pool, retrying each file that was in flight alone on a fresh one"""
+        nonlocal executor
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = _new_executor(workers)
+        while suspects:
+            item = suspects.pop(0)
+            try:
+                record = executor.submit(_analyze_path, item[0], streaming_threshold).result()
+            except BrokenProcessPool as e:
+                # Alone in the pool, so this file is what kills the worker
+                record = failure(item, f'Worker died: {e}')
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = _new_executor(workers)
+            except Exception as e:
+                record = failure(item, f'Worker failed: {e}')
+            write(item, record)
+
+    def submit(item):
+        try:
+            pending[executor.submit(_analyze_path, item[0], streaming_threshold)] = item
+        except BrokenProcessPool:
+            recover()
+            pending[executor.submit(_analyze_path, item[0], streaming_threshold)] = item
+
+    try:
+        for path in iter_corpus(corpus):
+            # Hashing here, not in the workers, lets duplicates and finished files be skipped up front
+            digest = AnalysisCache.file_digest(path)
+            if digest in done:
+                throughput.skipped += 1
+                continue
+            done.add(digest)
+
+            while len(pending) >= window:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            if suspects:
+                recover()
+            submit((path, digest, os.path.getsize(path)))
+
+        while pending or suspects:
+            if suspects:
+                recover()
+                continue
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', help='directory searched recursively for .mid/.midi files')
+    parser.add_argument('output', help='JSONL file, or a directory of part files for parquet')
+    parser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=1000, help='records per parquet part file')
+    parser.add_argument('--streaming-threshold', type=int, default=8 * 1024 * 1024,
+                        help='files larger than this many bytes use the constant-memory analyzer')
+    parser.add_argument('--retry-failed', action='store_true', help='analyze files that failed in an earlier run again')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.corpus):
+        print(f"Corpus directory not found: {args.corpus}", file=sys.stderr)
+        return 2
+
+    if args.format == 'parquet':
+        try:
+            writer = ParquetWriter(args.output, args.batch_size)
+        except ImportError:
+            print("Parquet output needs pyarrow (pip install pyarrow)", file=sys.stderr)
+            return 2
+    else:
+        writer = JSONLWriter(args.output)
+
+    try:
+        throughput = run(args.corpus, writer, args.workers, args.streaming_threshold,
+                         not args.retry_failed, args.progress_interval)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+
+    print(throughput.line())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,31 +1,241 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, send_file
 import os
 import json
+import hashlib
+import threading
 from werkzeug.utils import secure_filename
-from midi_analyzer import MIDIAnalyzer
-from recommendation_engine import RecommendationEngine
-from midi_generator import MIDIGenerator
+from midi_analyzer import MIDIAnalyzer, ANALYZER_VERSION
+from streaming_analyzer import StreamingAnalyzer
+from recommendation_engine import RecommendationEngine, RECOMMENDER_VERSION
+from midi_generator import MIDIGenerator, GENERATOR_VERSION, shared_patterns
+from analysis_cache import AnalysisCache
+from job_queue import JobQueue, QueueFullError
+from analysis_pool import AnalysisPool
+from midi_data import prewarm_music21
+from upload_buffer import SpoolingRequest, Upload
+from result_store import MemoryResultStore, DiskResultStore
+from batch import iter_batch_items, run_batch, is_zip
+from concurrent.futures import ThreadPoolExecutor
 import traceback
 import tempfile
 from io import BytesIO
 
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 128 * 1024 * 1024))  # 128MB max file size
+app.config['UPLOAD_SPOOL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 16 * 1024 * 1024))  # Larger uploads spool to disk
+app.config['STREAMING_THRESHOLD'] = int(os.environ.get('STREAMING_THRESHOLD', 8 * 1024 * 1024))  # Larger files stream
+app.config['ANALYSIS_CACHE_ENTRIES'] = int(os.environ.get('ANALYSIS_CACHE_ENTRIES', 256))
+app.config['ANALYSIS_CACHE_BYTES'] = int(os.environ.get('ANALYSIS_CACHE_BYTES', 64 * 1024 * 1024))
+app.config['ANALYSIS_CACHE_DIR'] = os.environ.get('ANALYSIS_CACHE_DIR')  # Optional disk tier
+app.config['ANALYSIS_CACHE_DISK_BYTES'] = int(os.environ.get('ANALYSIS_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+app.config['GENERATED_CACHE_BYTES'] = int(os.environ.get('GENERATED_CACHE_BYTES', 64 * 1024 * 1024))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_DEPTH'] = int(os.environ.get('JOB_QUEUE_DEPTH', 16))
+app.config['ANALYSIS_PROCESSES'] = int(os.environ.get('ANALYSIS_PROCESSES', 0))  # 0 analyzes in-process
+app.config['ANALYSIS_WORKER_MAX_TASKS'] = int(os.environ.get('ANALYSIS_WORKER_MAX_TASKS', 50))
+app.config['RESULT_STORE'] = os.environ.get('RESULT_STORE', 'disk')  # 'disk' or 'memory'
+app.config['RESULT_STORE_BYTES'] = int(os.environ.get('RESULT_STORE_BYTES', 256 * 1024 * 1024))
+app.config['RESULT_TTL'] = int(os.environ.get('RESULT_TTL', 3600))  # Seconds a download stays on disk
+app.config['RESULT_SWEEP_INTERVAL'] = int(os.environ.get('RESULT_SWEEP_INTERVAL', 60))
+app.config['BATCH_PROCESSES'] = int(os.environ.get('BATCH_PROCESSES', 0))  # 0 uses one per CPU core
+app.config['BATCH_MAX_FILES'] = int(os.environ.get('BATCH_MAX_FILES', 10000))
+app.config['PREWARM_MUSIC21'] = os.environ.get('PREWARM_MUSIC21') == '1'
+app.config['MAX_CUSTOM_DURATION'] = int(os.environ.get('MAX_CUSTOM_DURATION', 3600))  # Seconds
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Repeat uploads of the same bytes reuse earlier analysis and recommendations
+analysis_cache = AnalysisCache(
+    max_entries=app.config['ANALYSIS_CACHE_ENTRIES'],
+    max_bytes=app.config['ANALYSIS_CACHE_BYTES'],
+    cache_dir=app.config['ANALYSIS_CACHE_DIR'],
+    max_disk_bytes=app.config['ANALYSIS_CACHE_DISK_BYTES']
+)
+
+# Improved MIDI bytes by input, preferences and seed; kept apart from the JSON caches
+# so generated files only ever take a bounded amount of memory
+generated_cache = MemoryResultStore(max_bytes=app.config['GENERATED_CACHE_BYTES'])
+
+# Bounded pool for asynchronous uploads; over the depth limit clients get 429
+job_queue = JobQueue(
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_QUEUE_DEPTH']
+)
+
+# Generated downloads: bounded in memory, or on disk with expiry so abandoned results do not pile up
+if app.config['RESULT_STORE'] == 'memory':
+    result_store = MemoryResultStore(max_bytes=app.config['RESULT_STORE_BYTES'])
+else:
+    result_store = DiskResultStore(
+        app.config['UPLOAD_FOLDER'],
+        ttl=app.config['RESULT_TTL'],
+        max_bytes=app.config['RESULT_STORE_BYTES'],
+        sweep_interval=app.config['RESULT_SWEEP_INTERVAL']
+    )
+
+# Optional warm worker processes so analysis is not serialized on the GIL
+analysis_pool = None
+if app.config['ANALYSIS_PROCESSES'] > 0:
+    analysis_pool = AnalysisPool(
+        processes=app.config['ANALYSIS_PROCESSES'],
+        max_tasks_per_worker=app.config['ANALYSIS_WORKER_MAX_TASKS'],
+        prewarm_music21=app.config['PREWARM_MUSIC21']
+    )
+
+# Batches always fan out over worker processes, sharing the upload pool when one is configured;
+# every batch request draws on the same dispatch threads, so concurrent batches stay bounded
+batch_pool = analysis_pool or AnalysisPool(
+    processes=app.config['BATCH_PROCESSES'] or None,
+    max_tasks_per_worker=app.config['ANALYSIS_WORKER_MAX_TASKS'],
+    prewarm_music21=app.config['PREWARM_MUSIC21']
+)
+batch_executor = ThreadPoolExecutor(max_workers=batch_pool.processes, thread_name_prefix='batch')
+
+# music21 is imported lazily; optionally load it in the background so the
+# process starts serving immediately but the first slow-path request is warm
+if app.config['PREWARM_MUSIC21']:
+    threading.Thread(target=prewarm_music21, name='prewarm-music21', daemon=True).start()
+
 ALLOWED_EXTENSIONS = {'mid', 'midi'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def preferences_digest(user_preferences):
+    """Stable short hash of the user preferences for cache keys"""
+    encoded = json.dumps(user_preferences, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def run_analysis(upload, pool=None):
+    """
+    Analyze an upload in the pool's worker processes, or inline when there is no pool.
+    
+    Large files use the constant-memory streaming analyzer either way; without a pool
+    they run in the calling thread and the pool's timeout does not apply.
+    """
+    if upload.size > app.config['STREAMING_THRESHOLD']:
+        if pool is not None:
+            # Workers read large files from disk themselves rather than receiving pickled bytes
+            with upload.temporary_path() as path:
+                return pool.analyze_large_file(path)
+        return StreamingAnalyzer().analyze_data(upload.stream())
+    
+    midi_bytes = upload.read()
+    if pool is not None:
+        return pool.analyze(midi_bytes)
+    return MIDIAnalyzer().analyze_data(midi_bytes)
+
+def cached_analysis(upload, pool=None):
+    """Analysis of an upload, reused when these exact bytes were analyzed before"""
+    analysis_key = AnalysisCache.make_key(upload.digest, 'analysis', ANALYZER_VERSION)
+    analysis_result = analysis_cache.get(analysis_key)
+    if analysis_result is None:
+        analysis_result = run_analysis(upload, pool)
+        if analysis_result['success']:
+            analysis_cache.put(analysis_key, analysis_result)
+    return analysis_result
+
+def process_upload(upload, filename, user_preferences, seed=0, report_progress=None):
+    """Analyze an upload, build recommendations and optionally an improved MIDI from the given seed"""
+    if report_progress is None:
+        report_progress = lambda stage, progress: None
+    
+    try:
+        content_digest = upload.digest
+        
+        # Analyze the MIDI file, unless these exact bytes were analyzed before
+        report_progress('analyzing', 0.1)
+        analysis_result = cached_analysis(upload, analysis_pool)
+        
+        if not analysis_result['success']:
+            return {'error': analysis_result['error']}, 400
+        
+        # Generate personalized recommendations
+        report_progress('recommending', 0.5)
+        recommendations_key = AnalysisCache.make_key(
+            content_digest, 'recommendations', ANALYZER_VERSION, RECOMMENDER_VERSION, preferences_digest(user_preferences)
+        )
+        recommendations = analysis_cache.get(recommendations_key)
+        if recommendations is None:
+            rec_engine = RecommendationEngine()
+            recommendations = rec_engine.generate_recommendations(
+                analysis_result['analysis'], 
+                user_preferences
+            )
+            analysis_cache.put(recommendations_key, recommendations)
+        
+        result = {
+            'success': True,
+            'filename': filename,
+            'analysis': analysis_result['analysis'],
+            'recommendations': recommendations,
+            'user_preferences': user_preferences,
+            'seed': seed
+        }
+        
+        # Generate improved MIDI if requested
+        if user_preferences['auto_improve'] and user_preferences['goals']:
+            report_progress('generating', 0.7)
+            try:
+                # Generation is deterministic, so identical requests reuse the bytes made before
+                improved_key = AnalysisCache.make_key(
+                    content_digest, 'improved', ANALYZER_VERSION, GENERATOR_VERSION,
+                    preferences_digest(user_preferences), seed
+                )
+                improved_midi_data = generated_cache.get(improved_key)
+                if improved_midi_data is None:
+                    generator = MIDIGenerator()
+                    improved_midi_data = generator.apply_suggestions(
+                        upload.stream(), 
+                        analysis_result['analysis'], 
+                        recommendations, 
+                        user_preferences,
+                        seed,
+                        analysis_result.get('chord_timeline')
+                    )
+                    if improved_midi_data:
+                        generated_cache.put(improved_midi_data, improved_key)
+                
+                download_id = result_store.put(improved_midi_data) if improved_midi_data else None
+                if download_id:
+                    result['improved_midi'] = {
+                        'available': True,
+                        'download_id': download_id,
+                        'filename': f'improved_{filename}'
+                    }
+                else:
+                    result['improved_midi'] = {
+                        'available': False,
+                        'error': 'Improved MIDI is too large to store' if improved_midi_data else 'Failed to generate improved MIDI'
+                    }
+            except Exception as e:
+                print(f"Error generating improved MIDI: {e}")
+                result['improved_midi'] = {
+                    'available': False,
+                    'error': str(e)
+                }
+        
+        return result, 200
+    
+    finally:
+        # Release the upload's memory (or its spool file)
+        upload.close()
+
+def run_upload_job(report_progress, upload, filename, user_preferences, seed):
+    """Background job wrapper around process_upload"""
+    result, status_code = process_upload(upload, filename, user_preferences, seed, report_progress)
+    if status_code != 200:
+        raise ValueError(result['error'])
+    return result
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     try:
@@ -37,9 +247,10 @@ def upload_file():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and file.filename and allowed_file(file.filename):
+            # Read once from the request and kept in memory (spooled to disk when large)
+            # for the whole pipeline; nothing is written under the client's filename
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            upload = Upload.from_file_storage(file)
             
             # Get user preferences
             user_goals = request.form.getlist('goals')
@@ -57,72 +268,45 @@ def upload_file():
                 'instruments': request.form.getlist('instruments')
             }
             
-            # Analyze the MIDI file
-            analyzer = MIDIAnalyzer()
-            analysis_result = analyzer.analyze_file(filepath)
+            # Same file, preferences and seed always give the same improved MIDI
+            try:
+                seed = int(request.form.get('seed', 0))
+            except ValueError:
+                seed = -1
+            if seed < 0:
+                upload.close()
+                return jsonify({'error': 'Seed must be a non-negative integer'}), 400
             
-            if analysis_result['success']:
-                # Generate personalized recommendations
-                rec_engine = RecommendationEngine()
-                recommendations = rec_engine.generate_recommendations(
-                    analysis_result['analysis'], 
-                    user_preferences
-                )
+            if user_preferences['improvement_duration'] == 'custom':
+                try:
+                    custom_duration = float(user_preferences['custom_duration'])
+                except ValueError:
+                    custom_duration = -1
+                if not 0 < custom_duration <= app.config['MAX_CUSTOM_DURATION']:
+                    upload.close()
+                    return jsonify({'error': f"Custom duration must be between 0 and {app.config['MAX_CUSTOM_DURATION']} seconds"}), 400
+            
+            # Asynchronous mode: queue the work and let the client poll /jobs/<id>
+            if request.form.get('async') == 'on' or request.args.get('async') == '1':
+                try:
+                    job_id = job_queue.submit(run_upload_job, upload, filename, user_preferences, seed)
+                except QueueFullError:
+                    upload.close()
+                    response = jsonify({'error': 'Server is busy, please retry shortly'})
+                    response.headers['Retry-After'] = '5'
+                    return response, 429
+                except RuntimeError:
+                    upload.close()
+                    return jsonify({'error': 'Background processing is unavailable'}), 503
                 
-                result = {
+                return jsonify({
                     'success': True,
-                    'filename': filename,
-                    'analysis': analysis_result['analysis'],
-                    'recommendations': recommendations,
-                    'user_preferences': user_preferences
-                }
-                
-                # Generate improved MIDI if requested
-                if auto_improve and user_goals:
-                    try:
-                        generator = MIDIGenerator()
-                        improved_midi_data = generator.apply_suggestions(
-                            filepath, 
-                            analysis_result['analysis'], 
-                            recommendations, 
-                            user_preferences
-                        )
-                        
-                        if improved_midi_data:
-                            # Save improved MIDI to session or temporary storage
-                            import uuid
-                            session_id = str(uuid.uuid4())
-                            temp_improved_path = os.path.join(app.config['UPLOAD_FOLDER'], f'improved_{session_id}.mid')
-                            
-                            with open(temp_improved_path, 'wb') as f:
-                                f.write(improved_midi_data)
-                            
-                            result['improved_midi'] = {
-                                'available': True,
-                                'download_id': session_id,
-                                'filename': f'improved_{filename}'
-                            }
-                        else:
-                            result['improved_midi'] = {
-                                'available': False,
-                                'error': 'Failed to generate improved MIDI'
-                            }
-                    except Exception as e:
-                        print(f"Error generating improved MIDI: {e}")
-                        result['improved_midi'] = {
-                            'available': False,
-                            'error': str(e)
-                        }
-                
-                # Clean up original uploaded file
-                os.remove(filepath)
-                
-                return jsonify(result)
-            else:
-                # Clean up uploaded file
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-                return jsonify({'error': analysis_result['error']}), 400
+                    'job_id': job_id,
+                    'status_url': url_for('job_status', job_id=job_id)
+                }), 202
+            
+            result, status_code = process_upload(upload, filename, user_preferences, seed)
+            return jsonify(result), status_code
         
         return jsonify({'error': 'Invalid file type. Please upload a MIDI file (.mid or .midi)'}), 400
     
@@ -131,6 +315,61 @@ def upload_file():
         print(traceback.format_exc())
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
+@app.route('/batch', methods=['POST'])
+def batch_analyze():
+    """Analyze many MIDI files (multipart 'files' and/or zip archives), streaming one NDJSON line per file"""
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files selected'}), 400
+    
+    bad_names = [file.filename for file in files if not (allowed_file(file.filename) or is_zip(file.filename))]
+    if len(bad_names) == len(files):
+        return jsonify({'error': 'Please upload MIDI files (.mid or .midi) or zip archives of them'}), 400
+    
+    # Take every buffer over now: the request closes its files before the response finishes streaming
+    uploads = [(secure_filename(file.filename) or 'unnamed', Upload.from_file_storage(file)) for file in files]
+    items = iter_batch_items(uploads, app.config['UPLOAD_SPOOL_THRESHOLD'], app.config['MAX_CONTENT_LENGTH'])
+    
+    results = run_batch(
+        items,
+        lambda upload: cached_analysis(upload, batch_pool),
+        batch_executor,
+        window=2 * batch_pool.processes,
+        max_files=app.config['BATCH_MAX_FILES']
+    )
+    
+    def generate():
+        try:
+            for line in results:
+                yield json.dumps(line) + '\n'
+        finally:
+            # Also runs when the client disconnects mid-stream
+            results.close()
+            items.close()
+            for _, upload in uploads:
+                upload.close()
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    response = {
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress']
+    }
+    if job['status'] == 'done':
+        response['result'] = job['result']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    
+    return jsonify(response)
+
 @app.route('/results')
 def results():
     return render_template('results.html')
@@ -138,16 +377,13 @@ def results():
 @app.route('/download/<download_id>')
 def download_improved_midi(download_id):
     try:
-        # Construct the improved MIDI file path
-        improved_file_path = os.path.join(app.config['UPLOAD_FOLDER'], f'improved_{download_id}.mid')
-        
-        # Check if file exists
-        if not os.path.exists(improved_file_path):
+        improved_midi_data = result_store.get(download_id)
+        if improved_midi_data is None:
             return jsonify({'error': 'Improved MIDI file not found'}), 404
         
         # Send file for download
         return send_file(
-            improved_file_path,
+            BytesIO(improved_midi_data),
             as_attachment=True,
             download_name=f'improved_music_{download_id}.mid',
             mimetype='audio/midi'
@@ -160,11 +396,8 @@ def download_improved_midi(download_id):
 @app.route('/cleanup/<download_id>', methods=['POST'])
 def cleanup_improved_midi(download_id):
     try:
-        # Clean up the temporary improved MIDI file
-        improved_file_path = os.path.join(app.config['UPLOAD_FOLDER'], f'improved_{download_id}.mid')
-        
-        if os.path.exists(improved_file_path):
-            os.remove(improved_file_path)
+        # Results expire on their own; this just frees the space early
+        if result_store.delete(download_id):
             return jsonify({'success': True})
         else:
             return jsonify({'error': 'File not found'}), 404
@@ -173,5 +406,16 @@ def cleanup_improved_midi(download_id):
         print(f"Error cleaning up file: {e}")
         return jsonify({'error': 'Failed to cleanup file'}), 500
 
+@app.route('/stats')
+def stats():
+    """Occupancy of the caches, stores and job queue"""
+    return jsonify({
+        'analysis_cache': analysis_cache.stats(),
+        'generated_cache': generated_cache.stats(),
+        'result_store': result_store.stats(),
+        'pattern_library': shared_patterns.stats(),
+        'job_queue_depth': job_queue.depth()
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
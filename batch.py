@@ -0,0 +1,146 @@
+"""
+Batch analysis: many MIDI files from one request, fanned out over a pool and streamed back as they finish
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from upload_buffer import Upload
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+
+class BatchItemError(Exception):
+    """A problem with one file of a batch, reported on that file's own result line"""
+
+
+def is_zip(filename):
+    return filename.lower().endswith('.zip')
+
+
+def iter_batch_items(uploads, spool_threshold, max_file_bytes):
+    """
+    Yield (filename, Upload or BatchItemError) for every file of a batch.
+
+    uploads are (filename, Upload) pairs from the request. Zip archives are expanded
+    lazily, one member at a time, so only files in flight are held in memory.
+    """
+    for filename, upload in uploads:
+        if is_zip(filename):
+            yield from _iter_zip_members(filename, upload, spool_threshold, max_file_bytes)
+        elif filename.lower().endswith(MIDI_EXTENSIONS):
+            yield filename, upload
+        else:
+            upload.close()
+            yield filename, BatchItemError('Not a MIDI file (.mid or .midi)')
+
+
+def _iter_zip_members(filename, upload, spool_threshold, max_file_bytes):
+    try:
+        archive = zipfile.ZipFile(upload.stream())
+    except zipfile.BadZipFile as e:
+        upload.close()
+        yield filename, BatchItemError(f'Invalid zip archive: {e}')
+        return
+
+    try:
+        for info in archive.infolist():
+            member_name = f'{filename}/{info.filename}'
+            # Skip directories and the resource forks macOS adds to archives
+            if info.is_dir() or os.path.basename(info.filename).startswith('._'):
+                continue
+            if not info.filename.lower().endswith(MIDI_EXTENSIONS):
+                continue
+            if info.file_size > max_file_bytes:
+                yield member_name, BatchItemError(f'File exceeds the {max_file_bytes} byte limit')
+                continue
+            try:
+                with archive.open(info) as member:
+                    yield member_name, Upload.from_stream(member, spool_threshold)
+            except (zipfile.BadZipFile, OSError, RuntimeError, NotImplementedError) as e:
+                # Corrupt, encrypted or unsupported members fail alone
+                yield member_name, BatchItemError(f'Could not extract file: {e}')
+    finally:
+        archive.close()
+        upload.close()
+
+
+def _analyze_item(analyze, upload):
+    try:
+        return analyze(upload)
+    finally:
+        upload.close()
+
+
+def _result_line(index, filename, result):
+    line = {'index': index, 'filename': filename, 'success': bool(result.get('success'))}
+    if line['success']:
+        line['analysis'] = result['analysis']
+    else:
+        line['error'] = result.get('error', 'Analysis failed')
+    return line
+
+
+def run_batch(items, analyze, executor, window, max_files):
+    """
+    Run analyze(upload) for every batch item on the executor and yield one result dict
+    per file as it finishes, then a summary.
+
+    At most `window` files are in flight, so a huge archive is never fully extracted.
+    Each file's failure only affects its own line; 'index' gives its order in the request.
+    """
+    start = time.perf_counter()
+    pending = {}
+    counts = {'succeeded': 0, 'failed': 0}
+    truncated = False
+
+    def finished(done):
+        for future in done:
+            index, filename, _ = pending.pop(future)
+            try:
+                line = _result_line(index, filename, future.result())
+            except Exception as e:
+                print(f"Batch analysis of {filename} failed: {e}")
+                line = _result_line(index, filename, {'success': False, 'error': f'Error analyzing MIDI file: {e}'})
+            counts['succeeded' if line['success'] else 'failed'] += 1
+            yield line
+
+    try:
+        for index, (filename, item) in enumerate(items):
+            if index >= max_files:
+                if isinstance(item, Upload):
+                    item.close()
+                truncated = True
+                break
+
+            if isinstance(item, BatchItemError):
+                counts['failed'] += 1
+                yield {'index': index, 'filename': filename, 'success': False, 'error': str(item)}
+                continue
+
+            while len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+            pending[executor.submit(_analyze_item, analyze, item)] = (index, filename, item)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+
+        seconds = time.perf_counter() - start
+        files = counts['succeeded'] + counts['failed']
+        yield {
+            'done': True,
+            'files': files,
+            'succeeded': counts['succeeded'],
+            'failed': counts['failed'],
+            'truncated': truncated,
+            'seconds': round(seconds, 3),
+            'files_per_second': round(files / seconds, 2) if seconds > 0 else 0
+        }
+
+    finally:
+        # The client went away: drop work that has not started
+        for future, (_, _, upload) in list(pending.items()):
+            if future.cancel():
+                upload.close()
@@ -0,0 +1,97 @@
+"""
+Generator benchmark: duration extension and accompaniment on large synthetic MIDI files
+
+Usage: python benchmarks/generator_extend.py [--notes N] [--tracks N] [--runs N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import smf_writer  # noqa: E402
+from midi_analyzer import MIDIAnalyzer  # noqa: E402
+from midi_generator import MIDIGenerator  # noqa: E402
+
+TICKS_PER_BEAT = 480
+
+# (duration option, custom duration as a multiple of the song's length)
+SCENARIOS = [
+    ('extend_2x', None),
+    ('extend_4x', None),
+    ('custom', 2.5),
+]
+
+
+def synthetic_midi(note_count, track_count, seed=0):
+    """A type 1 file of eighth-note lines over a I-vi-IV-V progression, split across tracks"""
+    rng = np.random.default_rng(seed)
+    per_track = note_count // track_count
+    progression = np.array([0, 9, 5, 7])
+
+    chunks = []
+    for track in range(track_count):
+        onsets = np.arange(per_track, dtype=np.int64) * (TICKS_PER_BEAT // 2)
+        bars = onsets // (TICKS_PER_BEAT * 4)
+        pitches = 48 + 12 * (track % 3) + progression[bars % 4] + rng.choice([0, 4, 7], per_track)
+        events = smf_writer.note_events(onsets, TICKS_PER_BEAT // 2, pitches, 90, channel=track % 16)
+        chunks.append(smf_writer.encode_track(events))
+    return smf_writer.write_file(chunks, TICKS_PER_BEAT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notes', type=int, default=200000)
+    parser.add_argument('--tracks', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic_midi(args.notes, args.tracks)
+    with tempfile.NamedTemporaryFile(suffix='.mid', delete=False) as f:
+        f.write(data)
+        path = f.name
+
+    try:
+        result = MIDIAnalyzer().analyze_data(data)
+        analysis = result['analysis']
+        song_seconds = analysis['basic_info']['length_seconds']
+        print(f"input: {args.notes} notes on {args.tracks} tracks, {len(data) / 1e6:.1f} MB, {song_seconds:.0f} s")
+
+        for option, custom_multiple in SCENARIOS:
+            preferences = {
+                'goals': ['harmony', 'rhythm', 'melody', 'arrangement'],
+                'instruments': ['bass', 'drums', 'chords', 'strings', 'lead', 'pad'],
+                'target_genre': 'pop',
+                'improvement_duration': option,
+            }
+            if custom_multiple:
+                preferences['custom_duration'] = song_seconds * custom_multiple
+
+            generator = MIDIGenerator()
+            timings = []
+            size = 0
+            for _ in range(args.runs):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    output = generator.apply_suggestions(path, analysis, {}, preferences, seed=0, chord_timeline=result['chord_timeline'])
+                    timings.append(time.perf_counter() - start)
+                size = len(output or b'')
+
+            print(f"{option:10s} median {statistics.median(timings) * 1000:8.1f} ms, "
+                  f"min {min(timings) * 1000:8.1f} ms, output {size / 1e6:.1f} MB")
+    finally:
+        os.unlink(path)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Startup-time benchmark: `import app` must stay under a time budget and must not pull in music21
+
+Usage: python benchmarks/startup_budget.py [--budget SECONDS] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(elapsed, 'music21' in sys.modules)\n"
+)
+
+
+def measure_import(runs):
+    """Time `import app` in fresh interpreters so nothing is cached between runs"""
+    timings = []
+    music21_loaded = False
+
+    for _ in range(runs):
+        env = dict(os.environ, PREWARM_MUSIC21='0')
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(output[-2]))
+        music21_loaded = music21_loaded or output[-1] == 'True'
+
+    return timings, music21_loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget', type=float, default=0.5, help='maximum median import time in seconds')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    timings, music21_loaded = measure_import(args.runs)
+    median = statistics.median(timings)
+
+    print(f"import app: median {median * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms "
+          f"over {args.runs} runs (budget {args.budget * 1000:.0f} ms)")
+
+    failed = False
+    if music21_loaded:
+        print("FAIL: importing app loaded music21")
+        failed = True
+    if median > args.budget:
+        print("FAIL: import time over budget")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
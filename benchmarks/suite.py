@@ -0,0 +1,320 @@
+"""
+Benchmark suite: analyzer, recommendation engine and generator over synthetic MIDI fixtures
+
+Usage: python benchmarks/suite.py [--quick] [--sizes N,N] [--tracks N,N] [--tempo NAME,NAME]
+                                  [--stages NAME,NAME] [--runs N] [--save-baseline FILE] [--compare FILE]
+
+Every (fixture, stage) pair runs in a fresh interpreter so its peak RSS is its own.
+After a warm-up, wall time is taken over --runs; one further run under tracemalloc
+gives the peak traced allocation. --save-baseline stores the results as JSON and
+--compare reports the ratio against a stored baseline (best run for time), exiting 1
+on regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import smf_writer  # noqa: E402
+
+TICKS_PER_BEAT = 480
+NOTES_PER_CHORD = 3
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000, 1000000)
+QUICK_SIZES = (100, 1000, 10000)
+DEFAULT_TRACKS = (1, 64)
+
+# Tempo maps of increasing complexity: how many tempo changes over the song
+TEMPO_MAPS = {
+    'constant': lambda beats: 1,
+    'sections': lambda beats: 32,
+    'rubato': lambda beats: max(beats, 1),  # A change on every beat
+}
+
+# Changes smaller than these never count as regressions, whatever the ratio
+MIN_SLOWDOWN = 0.005  # seconds
+MIN_GROWTH_MB = 1.0
+
+STAGES = ('analyze', 'analyze_streaming', 'recommend', 'generate')
+
+GENERATOR_PREFERENCES = {
+    'goals': ['harmony', 'rhythm', 'melody', 'arrangement'],
+    'instruments': ['bass', 'drums', 'chords', 'strings', 'lead', 'pad'],
+    'target_genre': 'pop',
+    'improvement_duration': 'extend_2x',
+    'auto_improve': True,
+}
+
+
+def _conductor_track(tempo_count, beats):
+    """Time signature plus tempo_count tempo changes spread evenly over the song, swinging 80-160 BPM"""
+    events = [b'\x00\xff\x58\x04\x04\x02\x18\x08']
+    spacing = max(beats // tempo_count, 1) * TICKS_PER_BEAT
+    for index in range(tempo_count):
+        bpm = 120 + 40 * np.sin(index / 7)
+        tempo = int(60_000_000 / bpm)
+        delta = 0 if index == 0 else spacing
+        events.append(smf_writer.encode_varlen(delta) + b'\xff\x51\x03' + tempo.to_bytes(3, 'big'))
+    return smf_writer.track_chunk(b''.join(events))
+
+
+def synthetic_midi(note_count, track_count, tempo, seed=0):
+    """
+    A type 1 file: three-note eighth-note chords over I-vi-IV-V, split across tracks,
+    after a conductor track with the named tempo map
+    """
+    rng = np.random.default_rng(seed)
+    progression = np.array([0, 9, 5, 7])
+    per_track = max(note_count // track_count, NOTES_PER_CHORD)
+
+    chunks = []
+    for track in range(track_count):
+        chord_index = np.arange(per_track, dtype=np.int64) // NOTES_PER_CHORD
+        onsets = chord_index * (TICKS_PER_BEAT // 2)
+        bars = onsets // (TICKS_PER_BEAT * 4)
+        tones = np.array([0, 4, 7])[np.arange(per_track) % NOTES_PER_CHORD]
+        pitches = 36 + 12 * (track % 4) + progression[bars % 4] + tones
+        velocities = rng.integers(60, 110, per_track)
+        channel = track % 15 + (track % 15 >= 9)  # Keep off the percussion channel
+        events = smf_writer.note_events(onsets, TICKS_PER_BEAT // 2, pitches, velocities, channel)
+        chunks.append(smf_writer.encode_track(events))
+
+    beats = int(per_track // NOTES_PER_CHORD // 2) + 1
+    conductor = _conductor_track(TEMPO_MAPS[tempo](beats), beats)
+    return smf_writer.write_file([conductor] + chunks, TICKS_PER_BEAT)
+
+
+def fixture_path(fixtures_dir, note_count, track_count, tempo):
+    """Build the fixture once and reuse it; fixtures are deterministic"""
+    path = os.path.join(fixtures_dir, f'notes{note_count}-tracks{track_count}-{tempo}.mid')
+    if not os.path.exists(path):
+        data = synthetic_midi(note_count, track_count, tempo)
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(f'{path}.tmp', path)
+    return path
+
+
+def _peak_rss_mb():
+    # Linux carries ru_maxrss over from the parent across fork and exec, so prefer
+    # VmHWM, which belongs to this process's own address space
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other platforms kilobytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _stage_callable(stage, fixture, analysis, chord_timeline=None):
+    """A zero-argument function running one stage on prepared inputs"""
+    import contextlib
+    import io
+
+    def quiet(func):
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return func()
+        return run
+
+    if stage == 'analyze':
+        from midi_analyzer import MIDIAnalyzer
+        return quiet(lambda: MIDIAnalyzer().analyze_file(fixture))
+    if stage == 'analyze_streaming':
+        from streaming_analyzer import StreamingAnalyzer
+        return quiet(lambda: StreamingAnalyzer().analyze_file(fixture))
+    if stage == 'recommend':
+        from recommendation_engine import RecommendationEngine
+        return quiet(lambda: RecommendationEngine().generate_recommendations(analysis, GENERATOR_PREFERENCES))
+    if stage == 'generate':
+        from midi_generator import MIDIGenerator
+        return quiet(lambda: MIDIGenerator().apply_suggestions(fixture, analysis, {}, GENERATOR_PREFERENCES, seed=0, chord_timeline=chord_timeline))
+    raise ValueError(f'Unknown stage: {stage}')
+
+
+def run_stage(stage, fixture, analysis_path, runs):
+    """Child-process entry point: measure one stage and return its numbers"""
+    result = {}
+    if analysis_path:
+        with open(analysis_path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+
+    func = _stage_callable(stage, fixture, result.get('analysis'), result.get('chord_timeline'))
+    func()  # Warm-up: lazy imports and first-use caches are not what is being measured
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    # Taken before the tracemalloc run, whose bookkeeping inflates RSS
+    peak_rss = _peak_rss_mb()
+
+    tracemalloc.start()
+    func()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'wall_median': statistics.median(timings),
+        'wall_min': min(timings),
+        'peak_rss_mb': round(peak_rss, 1),
+        'traced_peak_mb': round(traced_peak / (1024 * 1024), 2),
+    }
+
+
+def measure(stage, fixture, analysis_path, runs):
+    """Run one stage in a fresh interpreter"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', stage, fixture, analysis_path or '', str(runs)]
+    completed = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def prepare_analysis(fixture, work_dir):
+    """Analyzer result (analysis and chord timeline) the recommend and generate stages start from, stored as JSON for the children"""
+    import contextlib
+    import io
+    from midi_analyzer import MIDIAnalyzer
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = MIDIAnalyzer().analyze_file(fixture)
+    if not result['success']:
+        return None
+    path = os.path.join(work_dir, os.path.basename(fixture) + '.analysis.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    return path
+
+
+def compare(results, baseline, threshold):
+    """Print ratios against a baseline; returns the keys that regressed"""
+    previous = {(entry['fixture'], entry['stage']): entry for entry in baseline['results']}
+    regressions = []
+
+    print(f"\n{'fixture':32s} {'stage':18s} {'time':>8s} {'rss':>8s} {'traced':>8s}")
+    for entry in results:
+        key = (entry['fixture'], entry['stage'])
+        old = previous.get(key)
+        if old is None or 'error' in entry or 'error' in old:
+            continue
+
+        ratios = {}
+        for metric in ('wall_min', 'peak_rss_mb', 'traced_peak_mb'):
+            ratios[metric] = entry[metric] / old[metric] if old[metric] > 0 else 1.0
+
+        # The best run is the least noisy, and a few milliseconds either way is noise
+        slower = ratios['wall_min'] > threshold and entry['wall_min'] - old['wall_min'] > MIN_SLOWDOWN
+        larger = ratios['peak_rss_mb'] > threshold or (
+            ratios['traced_peak_mb'] > threshold and entry['traced_peak_mb'] - old['traced_peak_mb'] > MIN_GROWTH_MB
+        )
+        flag = '  REGRESSION' if slower or larger else ''
+        if flag:
+            regressions.append(key)
+
+        print(f"{entry['fixture']:32s} {entry['stage']:18s} {ratios['wall_min']:7.2f}x "
+              f"{ratios['peak_rss_mb']:7.2f}x {ratios['traced_peak_mb']:7.2f}x{flag}")
+
+    return regressions
+
+
+def _csv(cast):
+    return lambda value: tuple(cast(part) for part in value.split(',') if part)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        stage, fixture, analysis_path, runs = sys.argv[2:6]
+        print(json.dumps(run_stage(stage, fixture, analysis_path or None, int(runs))))
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=_csv(int), default=DEFAULT_SIZES, help='note counts, comma separated')
+    parser.add_argument('--tracks', type=_csv(int), default=DEFAULT_TRACKS, help='track counts, comma separated')
+    parser.add_argument('--tempo', type=_csv(str), default=tuple(TEMPO_MAPS), help=f'tempo maps: {", ".join(TEMPO_MAPS)}')
+    parser.add_argument('--stages', type=_csv(str), default=STAGES, help=f'stages: {", ".join(STAGES)}')
+    parser.add_argument('--quick', action='store_true', help=f'only sizes {", ".join(map(str, QUICK_SIZES))}')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--fixtures-dir', default=os.path.join(tempfile.gettempdir(), 'midi-benchmark-fixtures'))
+    parser.add_argument('--save-baseline', metavar='FILE', help='write results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a baseline saved earlier')
+    parser.add_argument('--threshold', type=float, default=1.25, help='ratio over the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.tempo if name not in TEMPO_MAPS] + [name for name in args.stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown tempo map or stage: {', '.join(unknown)}")
+    sizes = QUICK_SIZES if args.quick else args.sizes
+
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+    results = []
+
+    print(f"{'fixture':32s} {'stage':18s} {'median ms':>10s} {'min ms':>10s} {'rss MB':>8s} {'traced MB':>10s}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for note_count in sizes:
+            for track_count in args.tracks:
+                for tempo in args.tempo:
+                    fixture = fixture_path(args.fixtures_dir, note_count, track_count, tempo)
+                    name = os.path.splitext(os.path.basename(fixture))[0]
+
+                    analysis_path = None
+                    if 'recommend' in args.stages or 'generate' in args.stages:
+                        analysis_path = prepare_analysis(fixture, work_dir)
+
+                    for stage in args.stages:
+                        if stage in ('recommend', 'generate') and analysis_path is None:
+                            entry = {'error': 'analysis failed'}
+                        else:
+                            entry = measure(stage, fixture, analysis_path, args.runs)
+                        entry.update(fixture=name, stage=stage)
+                        results.append(entry)
+
+                        if 'error' in entry:
+                            print(f"{name:32s} {stage:18s} ERROR {entry['error']}")
+                        else:
+                            print(f"{name:32s} {stage:18s} {entry['wall_median'] * 1000:10.1f} "
+                                  f"{entry['wall_min'] * 1000:10.1f} {entry['peak_rss_mb']:8.1f} {entry['traced_peak_mb']:10.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'runs': args.runs,
+                'results': results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} stage(s) regressed beyond {args.threshold:.2f}x")
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
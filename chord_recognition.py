@@ -0,0 +1,130 @@
+"""
+Chord recognition over beat-aligned segments using 12-bit pitch-class masks
+"""
+import numpy as np
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Triads come first so that, on equal scores, the simpler chord wins
+CHORD_QUALITIES = [
+    ('major', (0, 4, 7)),
+    ('minor', (0, 3, 7)),
+    ('diminished', (0, 3, 6)),
+    ('augmented', (0, 4, 8)),
+    ('suspended fourth', (0, 5, 7)),
+    ('suspended second', (0, 2, 7)),
+    ('dominant seventh', (0, 4, 7, 10)),
+    ('major seventh', (0, 4, 7, 11)),
+    ('minor seventh', (0, 3, 7, 10)),
+    ('half-diminished seventh', (0, 3, 6, 10)),
+    ('diminished seventh', (0, 3, 6, 9)),
+]
+
+NO_CHORD = -1
+
+# Longest timeline recognized, about 36 hours at 120 bpm
+MAX_BEATS = 1 << 18
+
+
+def _build_templates():
+    """Masks for every root and quality; template id = quality index * 12 + root"""
+    roots, qualities, masks = [], [], []
+    for quality_index, (_, intervals) in enumerate(CHORD_QUALITIES):
+        for root in range(12):
+            roots.append(root)
+            qualities.append(quality_index)
+            masks.append(sum(1 << ((root + interval) % 12) for interval in intervals))
+    return np.array(roots), np.array(qualities), np.array(masks)
+
+
+TEMPLATE_ROOTS, TEMPLATE_QUALITIES, TEMPLATE_MASKS = _build_templates()
+CHORD_NAMES = [f'{NOTE_NAMES[root]} {CHORD_QUALITIES[quality][0]}'
+               for root, quality in zip(TEMPLATE_ROOTS, TEMPLATE_QUALITIES)]
+
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(4096)], dtype=np.int16)
+
+
+def _build_lookup():
+    """Best template for each of the 4096 possible pitch-class sets"""
+    masks = np.arange(4096)[:, None]
+    templates = TEMPLATE_MASKS[None, :]
+
+    matched = POPCOUNT[masks & templates]
+    missing = POPCOUNT[templates & ~masks & 0xFFF]
+    extra = POPCOUNT[masks & ~templates & 0xFFF]
+    scores = 2 * matched - missing - extra
+
+    # A chord needs its root and at least three of its tones sounding
+    root_present = (masks >> TEMPLATE_ROOTS[None, :]) & 1 == 1
+    scores = np.where(root_present & (matched >= 3), scores, -100)
+
+    best = scores.argmax(axis=1)
+    lookup = np.where(scores[np.arange(4096), best] > -100, best, NO_CHORD).astype(np.int16)
+    lookup.setflags(write=False)
+    return lookup
+
+
+# Chord id for every pitch-class mask, built once at import
+CHORD_LOOKUP = _build_lookup()
+
+
+def segment_masks(notes, segment_ticks, segment_count):
+    """Pitch-class mask of the notes sounding in each fixed-length segment, up to segment_count"""
+    first = notes['onset'] // segment_ticks
+    last = (notes['onset'] + np.maximum(notes['duration'], 1) - 1) // segment_ticks
+    inside = first < segment_count
+    first = first[inside].astype(np.int64)
+    last = np.minimum(last[inside], segment_count - 1).astype(np.int64)
+    pitch_classes = (notes['pitch'][inside] % 12).astype(np.int64)
+
+    # Difference array per pitch class: +1 where a note starts sounding, -1 after it stops,
+    # so memory follows the segment count rather than how long each note is held
+    width = segment_count + 1
+    starts = np.bincount(pitch_classes * width + first, minlength=12 * width)
+    stops = np.bincount(pitch_classes * width + last + 1, minlength=12 * width)
+    sounding = np.cumsum((starts - stops).reshape(12, width), axis=1)[:, :segment_count] > 0
+
+    bits = (1 << np.arange(12, dtype=np.int64))[:, None]
+    return (sounding * bits).sum(axis=0)
+
+
+def recognize_chords(notes, ticks_per_beat, beats_per_bar=4):
+    """Chord timeline as (start_ticks, end_ticks, chord_ids) arrays in linear time"""
+    empty = np.empty(0, dtype=np.int64)
+    if not len(notes):
+        return empty, empty, empty
+
+    end_tick = int((notes['onset'] + notes['duration']).max())
+    # Pathological lengths (a note held for days) are analyzed up to the cap only
+    beat_count = min(end_tick // ticks_per_beat + 1, MAX_BEATS)
+
+    return chords_from_beat_masks(segment_masks(notes, ticks_per_beat, beat_count), ticks_per_beat, beats_per_bar)
+
+
+def chords_from_beat_masks(beat_masks, ticks_per_beat, beats_per_bar=4):
+    """Chord timeline from per-beat pitch-class masks"""
+    beat_count = len(beat_masks)
+    if not beat_count:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    bar_count = -(-beat_count // beats_per_bar)
+    beat_chords = CHORD_LOOKUP[beat_masks]
+
+    # Arpeggiated or broken chords rarely fill a single beat; fall back to the whole bar
+    padded = np.pad(beat_masks, (0, bar_count * beats_per_bar - beat_count))
+    bar_masks = np.bitwise_or.reduceat(padded, np.arange(0, len(padded), beats_per_bar))
+    bar_chords = CHORD_LOOKUP[bar_masks]
+    chords = np.where(beat_chords != NO_CHORD, beat_chords, bar_chords[np.arange(beat_count) // beats_per_bar])
+
+    # Merge runs of the same chord and drop segments without one
+    run_starts = np.flatnonzero(np.concatenate(([True], chords[1:] != chords[:-1])))
+    run_ends = np.append(run_starts[1:], beat_count)
+    keep = chords[run_starts] != NO_CHORD
+
+    return (run_starts[keep] * ticks_per_beat,
+            run_ends[keep] * ticks_per_beat,
+            chords[run_starts[keep]].astype(np.int64))
+
+
+def chord_name(chord_id):
+    return CHORD_NAMES[chord_id]
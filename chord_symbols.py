@@ -0,0 +1,164 @@
+"""
+Chord-symbol parser producing interned Chord values
+"""
+import re
+from functools import lru_cache
+from chord_recognition import NOTE_NAMES, CHORD_QUALITIES
+
+QUALITY_INTERVALS = dict(CHORD_QUALITIES)
+
+# Triad each quality is built on, for major/minor style checks
+QUALITY_TRIADS = {
+    'major': 'major',
+    'minor': 'minor',
+    'diminished': 'diminished',
+    'augmented': 'augmented',
+    'suspended fourth': 'suspended',
+    'suspended second': 'suspended',
+    'dominant seventh': 'major',
+    'major seventh': 'major',
+    'minor seventh': 'minor',
+    'half-diminished seventh': 'diminished',
+    'diminished seventh': 'diminished',
+}
+
+# Short suffixes as written in lead sheets; matched longest first and case-sensitively
+SUFFIX_QUALITIES = {
+    '': 'major', 'M': 'major', 'maj': 'major', 'Maj': 'major',
+    'm': 'minor', 'min': 'minor', '-': 'minor',
+    'dim': 'diminished', '°': 'diminished', 'o': 'diminished',
+    'aug': 'augmented', '+': 'augmented',
+    'sus': 'suspended fourth', 'sus4': 'suspended fourth', 'sus2': 'suspended second',
+    '7': 'dominant seventh', 'dom7': 'dominant seventh',
+    'maj7': 'major seventh', 'Maj7': 'major seventh', 'M7': 'major seventh', 'Δ': 'major seventh', 'Δ7': 'major seventh',
+    'm7': 'minor seventh', 'min7': 'minor seventh', '-7': 'minor seventh',
+    'm7b5': 'half-diminished seventh', 'min7b5': 'half-diminished seventh', 'ø': 'half-diminished seventh', 'ø7': 'half-diminished seventh',
+    'dim7': 'diminished seventh', '°7': 'diminished seventh', 'o7': 'diminished seventh',
+}
+SUFFIXES_BY_LENGTH = sorted(SUFFIX_QUALITIES, key=len, reverse=True)
+
+# A bare 9/11/13 implies the seventh underneath it
+SEVENTH_OF_TRIAD = {'major': 'dominant seventh', 'minor': 'minor seventh'}
+
+ACCIDENTALS = {'#': 1, '♯': 1, 'b': -1, '♭': -1}
+NATURAL_PITCH_CLASSES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+DEGREE_SEMITONES = {2: 2, 4: 5, 6: 9, 9: 2, 11: 5, 13: 9}
+EXTENSION_NAMES = {1: 'b9', 2: '9', 3: '#9', 5: '11', 6: '#11', 8: 'b13', 9: '13'}
+
+ROOT_PATTERN = re.compile(r'\s*([A-Ga-g])([#b♯♭]*)')
+EXTENSION_PATTERN = re.compile(r'\(?(add)?([#b♯♭]?)(2|4|6|9|11|13)\)?')
+
+
+class Chord:
+    """Immutable chord value; equal chords are the same object, so `is` and hashing are by identity"""
+
+    __slots__ = ('root', 'quality', 'extensions', 'bass', 'triad', 'pitch_classes', 'mask')
+
+    _interned = {}
+
+    def __new__(cls, root, quality, extensions=(), bass=None):
+        extensions = tuple(sorted(set(extensions)))
+        if bass == root:
+            bass = None
+        key = (root, quality, extensions, bass)
+        chord = cls._interned.get(key)
+        if chord is not None:
+            return chord
+
+        chord = object.__new__(cls)
+        set_slot = object.__setattr__
+        set_slot(chord, 'root', root)
+        set_slot(chord, 'quality', quality)
+        set_slot(chord, 'extensions', extensions)
+        set_slot(chord, 'bass', bass)
+        set_slot(chord, 'triad', QUALITY_TRIADS[quality])
+
+        pitch_classes = [(root + interval) % 12 for interval in QUALITY_INTERVALS[quality]]
+        pitch_classes += [(root + interval) % 12 for interval in extensions if (root + interval) % 12 not in pitch_classes]
+        set_slot(chord, 'pitch_classes', tuple(pitch_classes))
+        set_slot(chord, 'mask', sum(1 << pc for pc in set(pitch_classes)))
+
+        return cls._interned.setdefault(key, chord)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Chord is immutable')
+
+    def __reduce__(self):
+        return (Chord, (self.root, self.quality, self.extensions, self.bass))
+
+    @property
+    def bass_pitch_class(self):
+        return self.root if self.bass is None else self.bass
+
+    @property
+    def name(self):
+        """Spelled-out name in the analyzer's style, e.g. 'A minor seventh'"""
+        name = f'{NOTE_NAMES[self.root]} {self.quality}'
+        if self.extensions:
+            name += ' add ' + ' '.join(EXTENSION_NAMES.get(interval, str(interval)) for interval in self.extensions)
+        if self.bass is not None:
+            name += f' over {NOTE_NAMES[self.bass]}'
+        return name
+
+    def __repr__(self):
+        return f'Chord({self.name!r})'
+
+
+def pitch_class(note_name):
+    """Pitch class of a note name like 'F#' or 'Bb', or None if it is not one"""
+    match = ROOT_PATTERN.fullmatch(note_name) if note_name else None
+    if not match:
+        return None
+    return (NATURAL_PITCH_CLASSES[match.group(1).upper()] + sum(ACCIDENTALS[a] for a in match.group(2))) % 12
+
+
+@lru_cache(maxsize=4096)
+def parse_chord(symbol):
+    """
+    Parse a chord symbol into an interned Chord, or return None if it is not one.
+
+    Accepts lead-sheet symbols ('F#m7', 'Bbmaj9', 'Csus4/G', 'G7(b9)') and the
+    analyzer's spelled-out names ('A minor seventh', 'C# major').
+    """
+    if not symbol:
+        return None
+    match = ROOT_PATTERN.match(symbol)
+    if not match:
+        return None
+    root = pitch_class(match.group(0))
+    rest = symbol[match.end():].strip()
+
+    bass = None
+    if '/' in rest:
+        rest, bass_name = rest.rsplit('/', 1)
+        bass = pitch_class(bass_name.strip())
+        if bass is None:
+            return None
+        rest = rest.strip()
+
+    # Spelled-out quality names from chord recognition
+    if rest.lower() in QUALITY_INTERVALS:
+        return Chord(root, rest.lower(), (), bass)
+
+    suffix = next(s for s in SUFFIXES_BY_LENGTH if rest.startswith(s))
+    quality = SUFFIX_QUALITIES[suffix]
+    rest = rest[len(suffix):]
+
+    extensions = []
+    position = 0
+    while position < len(rest):
+        extension = EXTENSION_PATTERN.match(rest, position)
+        if not extension or extension.end() == position:
+            return None
+        added, accidental, degree = extension.groups()
+        degree = int(degree)
+        if degree >= 9 and not added and not accidental and not extensions:
+            # 'C9' is a dominant ninth, 'Cmaj9' a major ninth
+            if suffix in ('maj', 'Maj', 'M'):
+                quality = 'major seventh'
+            else:
+                quality = SEVENTH_OF_TRIAD.get(quality, quality)
+        extensions.append((DEGREE_SEMITONES[degree] + sum(ACCIDENTALS[a] for a in accidental)) % 12)
+        position = extension.end()
+
+    return Chord(root, quality, extensions, bass)
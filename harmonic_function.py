@@ -0,0 +1,148 @@
+"""
+Vectorized Roman-numeral and functional-harmony analysis of chord timelines
+"""
+import numpy as np
+from chord_recognition import CHORD_QUALITIES, NO_CHORD
+from music_theory import MODE_INTERVALS, CHORD_FUNCTIONS, PROGRESSION_STRENGTHS
+
+NUMERALS = ('I', 'II', 'III', 'IV', 'V', 'VI', 'VII')
+STRENGTH_LABELS = ('Weak', 'Moderate', 'Strong')
+CHROMATIC = 7  # Degree index for roots outside the scale
+
+# Roots outside the scale are spelled against the major scale, as in bVII or #IV
+CHROMATIC_SPELLINGS = ('I', 'bII', 'II', 'bIII', 'III', 'IV', '#IV', 'V', 'bVI', 'VI', 'bVII', 'VII')
+
+QUALITY_INDEX = {quality: index for index, (quality, _) in enumerate(CHORD_QUALITIES)}
+
+# How each quality decorates its numeral: (lower case?, suffix)
+QUALITY_NUMERAL_STYLES = {
+    'major': (False, ''),
+    'minor': (True, ''),
+    'diminished': (True, '°'),
+    'augmented': (False, '+'),
+    'suspended fourth': (False, 'sus4'),
+    'suspended second': (False, 'sus2'),
+    'dominant seventh': (False, '7'),
+    'major seventh': (False, 'maj7'),
+    'minor seventh': (True, '7'),
+    'half-diminished seventh': (True, 'ø7'),
+    'diminished seventh': (True, '°7'),
+}
+
+# Degree-to-degree transition scores; anything touching a chromatic chord is weak
+STRENGTH_MATRIX = np.zeros((8, 8), dtype=np.int8)
+STRENGTH_MATRIX[:7, :7] = [[STRENGTH_LABELS.index(label) for label in row] for row in PROGRESSION_STRENGTHS]
+STRENGTH_MATRIX.setflags(write=False)
+
+
+def _build_mode_tables():
+    """Per mode: scale degree of each semitone above the tonic and its numeral spelling"""
+    degrees, numerals = {}, {}
+    for mode, intervals in MODE_INTERVALS.items():
+        degree_of = np.full(12, CHROMATIC, dtype=np.int8)
+        degree_of[list(intervals)] = np.arange(7)
+
+        spellings = []
+        for interval in range(12):
+            if interval in intervals:
+                spellings.append(NUMERALS[intervals.index(interval)])
+            elif CHROMATIC_SPELLINGS[interval] in NUMERALS:
+                # The plain numeral belongs to a scale degree in this mode: raise the degree below
+                spellings.append('#' + NUMERALS[intervals.index((interval - 1) % 12)])
+            else:
+                spellings.append(CHROMATIC_SPELLINGS[interval])
+
+        # Label for every (interval, quality) pair
+        labels = np.empty((12, len(CHORD_QUALITIES)), dtype=object)
+        for interval, spelling in enumerate(spellings):
+            for quality, index in QUALITY_INDEX.items():
+                lower, suffix = QUALITY_NUMERAL_STYLES[quality]
+                accidental = spelling.rstrip('IV')
+                numeral = spelling[len(accidental):]
+                labels[interval, index] = accidental + (numeral.lower() if lower else numeral) + suffix
+
+        degree_of.setflags(write=False)
+        degrees[mode] = degree_of
+        numerals[mode] = labels
+    return degrees, numerals
+
+
+DEGREE_OF_INTERVAL, NUMERAL_LABELS = _build_mode_tables()
+
+FUNCTION_LABELS = {mode: np.array(functions + ('Chromatic',), dtype=object) for mode, functions in CHORD_FUNCTIONS.items()}
+
+
+def chord_ids_from_chords(chords):
+    """Chord-recognition ids (quality index * 12 + root) for parsed Chord values"""
+    return np.array([
+        QUALITY_INDEX[chord.quality] * 12 + chord.root if chord is not None else NO_CHORD
+        for chord in chords
+    ], dtype=np.int64)
+
+
+def analyze_functions(chord_ids, tonic, mode='major'):
+    """
+    Map a chord timeline to scale degrees and score every transition.
+
+    Returns a dict of arrays: 'degrees' (0-6, 7 for chromatic), 'numerals',
+    'functions' and per-transition 'strengths' (0 weak, 1 moderate, 2 strong).
+    Unrecognized chords (NO_CHORD) are dropped first.
+    """
+    mode = mode if mode in MODE_INTERVALS else 'minor'
+    chord_ids = np.asarray(chord_ids, dtype=np.int64)
+    chord_ids = chord_ids[chord_ids != NO_CHORD]
+
+    intervals = (chord_ids % 12 - tonic) % 12
+    qualities = chord_ids // 12
+    degrees = DEGREE_OF_INTERVAL[mode][intervals]
+
+    return {
+        'degrees': degrees,
+        'numerals': NUMERAL_LABELS[mode][intervals, qualities],
+        'functions': FUNCTION_LABELS[mode][degrees],
+        'strengths': STRENGTH_MATRIX[degrees[:-1], degrees[1:]]
+    }
+
+
+def window_strengths(strengths, window):
+    """Mean transition strength of every run of `window` consecutive transitions"""
+    if len(strengths) < window:
+        return np.array([strengths.mean()]) if len(strengths) else np.empty(0)
+    totals = np.concatenate(([0], np.cumsum(strengths, dtype=np.int64)))
+    return (totals[window:] - totals[:-window]) / window
+
+
+def summarize_functions(functions, window=8, max_labels=10):
+    """JSON-ready aggregates over the whole timeline plus labels for its opening"""
+    degrees = functions['degrees']
+    strengths = functions['strengths']
+    transitions = len(strengths)
+    counts = np.bincount(strengths, minlength=3)
+
+    # Cadences: V (or V7) to I and IV to I
+    arrivals = degrees[1:] == 0
+    authentic = int(np.count_nonzero(arrivals & (degrees[:-1] == 4)))
+    plagal = int(np.count_nonzero(arrivals & (degrees[:-1] == 3)))
+
+    windowed = window_strengths(strengths, window)
+    numerals = functions['numerals']
+
+    return {
+        'roman_numerals': numerals[:max_labels].tolist(),
+        'transitions': [
+            {'from': numerals[i], 'to': numerals[i + 1], 'strength': STRENGTH_LABELS[strengths[i]]}
+            for i in range(min(transitions, max_labels - 1))
+        ],
+        'strong_transitions': int(counts[2]),
+        'moderate_transitions': int(counts[1]),
+        'weak_transitions': int(counts[0]),
+        'functional_strength': round(float(strengths.mean()) / 2, 2) if transitions else 0,
+        'authentic_cadences': authentic,
+        'plagal_cadences': plagal,
+        'diatonic_ratio': round(float(np.count_nonzero(degrees != CHROMATIC)) / len(degrees), 2) if len(degrees) else 0,
+        'window_strength': {
+            'window': window,
+            'lowest': round(float(windowed.min()) / 2, 2) if len(windowed) else 0,
+            'highest': round(float(windowed.max()) / 2, 2) if len(windowed) else 0
+        }
+    }
@@ -0,0 +1,96 @@
+"""
+Background job queue for long-running upload processing
+"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of pending jobs"""
+
+
+class JobQueue:
+    """Bounded worker pool running jobs in the background with pollable status"""
+
+    def __init__(self, max_workers=2, max_pending=16, result_ttl=600):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """Queue func(report_progress, *args) and return its job id"""
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if active >= self.max_pending:
+                raise QueueFullError(f'{active} jobs already pending')
+
+            job_id = str(uuid.uuid4())
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'stage': 'queued',
+                'progress': 0.0,
+                'result': None,
+                'error': None,
+                'created': time.time(),
+                'finished': None
+            }
+
+        try:
+            self._executor.submit(self._run, job_id, func, args)
+        except RuntimeError:
+            # Executor already shut down
+            with self._lock:
+                del self._jobs[job_id]
+            raise
+
+        return job_id
+
+    def get(self, job_id):
+        """Return a snapshot of a job's status, or None if unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def depth(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, status='running', stage='running')
+
+        def report_progress(stage, progress):
+            self._update(job_id, stage=stage, progress=progress)
+
+        try:
+            result = func(report_progress, *args)
+            self._update(job_id, status='done', stage='done', progress=1.0,
+                         result=result, finished=time.time())
+        except Exception as e:
+            print(f"Background job {job_id} failed: {e}")
+            print(traceback.format_exc())
+            self._update(job_id, status='failed', stage='failed', error=str(e), finished=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+
+    def _prune(self):
+        """Drop finished jobs older than the result TTL (caller holds the lock)"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished'] is not None and job['finished'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
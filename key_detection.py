@@ -0,0 +1,121 @@
+"""
+Key detection by correlating pitch-class histograms with key profiles
+"""
+import numpy as np
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Major and minor key profiles indexed from the tonic
+KEY_PROFILES = {
+    'krumhansl': (
+        [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88],
+        [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17],
+    ),
+    'temperley': (
+        [0.748, 0.060, 0.488, 0.082, 0.670, 0.460, 0.096, 0.715, 0.104, 0.366, 0.057, 0.400],
+        [0.712, 0.084, 0.474, 0.618, 0.049, 0.460, 0.105, 0.747, 0.404, 0.067, 0.133, 0.330],
+    ),
+    'aarden': (
+        [17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587, 0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122],
+        [18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362, 0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623],
+    ),
+}
+
+# Rows 0-11 are C..B major, rows 12-23 are C..B minor
+KEY_NAMES = [f'{name} major' for name in NOTE_NAMES] + [f'{name} minor' for name in NOTE_NAMES]
+KEY_MODES = ['major'] * 12 + ['minor'] * 12
+
+
+def _standardize(values):
+    """Zero-mean, unit-variance rows so a dot product divided by 12 is Pearson's r"""
+    values = np.asarray(values, dtype=np.float64)
+    centered = values - values.mean(axis=-1, keepdims=True)
+    std = centered.std(axis=-1, keepdims=True)
+    return np.divide(centered, std, out=np.zeros_like(centered), where=std > 0)
+
+
+def _build_profile_matrices():
+    matrices = {}
+    for name, (major, minor) in KEY_PROFILES.items():
+        rows = [np.roll(major, tonic) for tonic in range(12)] + [np.roll(minor, tonic) for tonic in range(12)]
+        matrices[name] = _standardize(rows)
+        matrices[name].setflags(write=False)
+    return matrices
+
+
+# Standardized 24x12 matrices, built once at import
+PROFILE_MATRICES = _build_profile_matrices()
+
+
+def pitch_class_histogram(notes):
+    """Duration-weighted pitch-class histogram of a note table"""
+    weights = np.maximum(notes['duration'], 1).astype(np.float64)
+    return np.bincount(notes['pitch'] % 12, weights=weights, minlength=12)
+
+
+def key_correlations(histograms, profile='krumhansl'):
+    """Correlate one histogram (12,) or many (n, 12) with all 24 keys at once"""
+    matrix = PROFILE_MATRICES.get(profile, PROFILE_MATRICES['krumhansl'])
+    return _standardize(histograms) @ matrix.T / 12
+
+
+def detect_key(notes, profile='krumhansl', alternatives=4):
+    """Best key for a note table with its correlation and the runner-up keys"""
+    if not len(notes):
+        return None
+    return detect_key_from_histogram(pitch_class_histogram(notes), profile, alternatives)
+
+
+def detect_key_from_histogram(histogram, profile='krumhansl', alternatives=4):
+    """Best key for a 12-bin pitch-class histogram with the runner-up keys"""
+    correlations = key_correlations(histogram, profile)
+    ranked = np.argsort(-correlations)
+    best = ranked[0]
+
+    return {
+        'key': KEY_NAMES[best],
+        'mode': KEY_MODES[best],
+        'confidence': round(max(float(correlations[best]), 0.0), 3),
+        'alternatives': [
+            {'key': KEY_NAMES[index], 'confidence': round(max(float(correlations[index]), 0.0), 3)}
+            for index in ranked[1:alternatives + 1]
+        ]
+    }
+
+
+def detect_key_sections(notes, window_ticks, profile='krumhansl'):
+    """Per-window keys, with consecutive windows in the same key merged into sections"""
+    if not len(notes) or window_ticks <= 0:
+        return []
+
+    window_index = (notes['onset'] // window_ticks).astype(np.int64)
+    window_count = int(window_index.max()) + 1
+    weights = np.maximum(notes['duration'], 1).astype(np.float64)
+    histograms = np.bincount(window_index * 12 + notes['pitch'] % 12, weights=weights,
+                             minlength=window_count * 12).reshape(window_count, 12)
+    return key_sections_from_histograms(histograms, profile)
+
+
+def key_sections_from_histograms(histograms, profile='krumhansl'):
+    """Key sections from per-window (n, 12) duration-weighted pitch-class histograms"""
+    # Only windows with sounding notes get a key
+    windows = np.flatnonzero(histograms.sum(axis=1) > 0)
+    if not len(windows):
+        return []
+    correlations = key_correlations(histograms[windows], profile)
+    best = correlations.argmax(axis=1)
+    confidence = np.maximum(correlations[np.arange(len(windows)), best], 0.0)
+
+    run_starts = np.flatnonzero(np.concatenate(([True], best[1:] != best[:-1])))
+    run_ends = np.append(run_starts[1:], len(windows))
+    mean_confidence = np.add.reduceat(confidence, run_starts) / (run_ends - run_starts)
+
+    return [
+        {
+            'key': KEY_NAMES[best[start]],
+            'start_window': int(windows[start]),
+            'end_window': int(windows[end - 1]),
+            'confidence': round(float(mean), 3)
+        }
+        for start, end, mean in zip(run_starts, run_ends, mean_confidence)
+    ]
@@ -0,0 +1,101 @@
+"""
+Shared MIDI decoding for the analysis pipeline
+"""
+import io
+import mido
+import numpy as np
+from tempo_map import TempoMap
+
+# One row per note; every analysis statistic is computed over these columns
+NOTE_DTYPE = np.dtype([
+    ('onset', np.int64),
+    ('duration', np.int64),
+    ('pitch', np.uint8),
+    ('velocity', np.uint8),
+    ('channel', np.uint8),
+    ('track', np.uint16),
+])
+
+
+def read_source(source):
+    """Bytes of a MIDI file given as bytes, a binary buffer (read from its current position) or a path"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def prewarm_music21():
+    """Import music21 ahead of time so the first request that needs it does not pay for it"""
+    import music21  # noqa: F401
+
+
+class MIDIData:
+    """Single decoded view of a MIDI file shared by every analysis pass"""
+
+    def __init__(self, data):
+        self.data = data
+        midi_file = mido.MidiFile(file=io.BytesIO(data))
+
+        self.format = midi_file.type
+        self.ticks_per_beat = midi_file.ticks_per_beat
+        self.track_count = len(midi_file.tracks)
+
+        self.notes = np.empty(0, dtype=NOTE_DTYPE)
+        self.tempo_changes = []     # (tick, microseconds per beat)
+        self.time_signatures = []   # (tick, numerator, denominator)
+        self.key_signatures = []    # (tick, key name)
+        self.end_tick = 0
+
+        self._decode(midi_file)
+        self.tempo_map = TempoMap(self.tempo_changes, self.ticks_per_beat)
+
+    @classmethod
+    def from_file(cls, filepath):
+        """Read a MIDI file from disk and decode it"""
+        with open(filepath, 'rb') as f:
+            return cls(f.read())
+
+    def _decode(self, midi_file):
+        """Walk every track once, pairing note on/off messages into the note table"""
+        notes = []
+
+        for track_index, track in enumerate(midi_file.tracks):
+            tick = 0
+            active = {}
+
+            for msg in track:
+                tick += msg.time
+
+                if msg.type == 'note_on' and msg.velocity > 0:
+                    active.setdefault((msg.channel, msg.note), []).append((tick, msg.velocity))
+                elif msg.type == 'note_off' or msg.type == 'note_on':
+                    started = active.get((msg.channel, msg.note))
+                    if started:
+                        onset, velocity = started.pop(0)
+                        notes.append((onset, tick - onset, msg.note, velocity, msg.channel, track_index))
+                elif msg.type == 'set_tempo':
+                    self.tempo_changes.append((tick, msg.tempo))
+                elif msg.type == 'time_signature':
+                    self.time_signatures.append((tick, msg.numerator, msg.denominator))
+                elif msg.type == 'key_signature':
+                    self.key_signatures.append((tick, msg.key))
+
+            # Notes still sounding at the end of the track end with it
+            for (channel, pitch), started in active.items():
+                for onset, velocity in started:
+                    notes.append((onset, tick - onset, pitch, velocity, channel, track_index))
+
+            self.end_tick = max(self.end_tick, tick)
+
+        self.notes = np.array(notes, dtype=NOTE_DTYPE)
+        self.notes.sort(order=('onset', 'pitch'))
+        self.tempo_changes.sort()
+        self.time_signatures.sort()
+
+    @property
+    def length_seconds(self):
+        """Playback length in seconds following the tempo changes"""
+        return self.tempo_map.tick_to_seconds(self.end_tick)
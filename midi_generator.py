@@ -1,34 +1,59 @@
-import mido
-from music21 import stream, note, chord, meter, tempo, pitch, duration, key
+import io
+import os
 import numpy as np
-import random
+from concurrent.futures import ThreadPoolExecutor
 from music_theory import MusicTheoryHelper
+from chord_symbols import parse_chord
+from tempo_map import TempoMap
+import smf_reader
+import smf_writer
+from pattern_library import PatternLibrary, DRUM_PATTERNS
+from accompaniment import Accompaniment
+from midi_data import read_source
+
+# Accompaniment parts in track order, with the goals that call for each (None: always)
+PART_GOALS = {
+    'bass': ('harmony', 'arrangement'),
+    'drums': ('rhythm',),
+    'chords': ('harmony', 'arrangement'),
+    'strings': None,
+    'lead': ('melody',),
+    'pad': ('arrangement',),
+}
+
+# Longest extension, as a multiple of the original length, and the largest original
+# material it may splice; beyond these the output would be built before any store rejects it
+MAX_DURATION_MULTIPLIER = 64
+MAX_EXTENDED_BYTES = 256 * 1024 * 1024
+
+# Bump when changes to generation alter the output for the same input, preferences and seed
+GENERATOR_VERSION = 1
+
+# Templates and part-building threads are shared by every generator instance
+shared_patterns = PatternLibrary()
+shared_executor = ThreadPoolExecutor(max_workers=min(len(PART_GOALS), os.cpu_count() or 1), thread_name_prefix='part-build')
 
 class MIDIGenerator:
-    def __init__(self):
+    def __init__(self, patterns=None, executor=None):
         self.music_theory = MusicTheoryHelper()
+        self.patterns = patterns or shared_patterns
+        self.executor = executor or shared_executor
         self.note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
     
-    def apply_suggestions(self, original_filepath, analysis, recommendations, user_preferences):
-        """Apply recommendations to generate an improved MIDI file"""
+    def apply_suggestions(self, original, analysis, recommendations, user_preferences, seed=None, chord_timeline=None):
+        """
+        Apply recommendations to generate an improved MIDI file; the same seed gives the same bytes.
+        
+        The original may be bytes, a binary buffer or a file path. The chord timeline is the
+        analyzer result's 'chord_timeline'; without it the parts follow the key's tonic chord.
+        """
         try:
             print(f"Starting MIDI improvement process...")
             
-            # Load the original MIDI file with mido
-            original_midi = mido.MidiFile(original_filepath)
-            
-            # Create improved version using mido directly for better compatibility
-            improved_midi = self._create_improved_midi(original_midi, analysis, user_preferences)
-            
-            if improved_midi:
-                # Convert to bytes
-                import io
-                midi_bytes = io.BytesIO()
-                improved_midi.save(file=midi_bytes)
-                midi_bytes.seek(0)
-                return midi_bytes.read()
+            # The original file stays as raw bytes; its tracks are spliced into the output
+            original_data = read_source(original)
             
-            return None
+            return self._create_improved_midi(original_data, analysis, user_preferences, seed, chord_timeline)
             
         except Exception as e:
             print(f"Error applying suggestions: {e}")
@@ -36,8 +61,8 @@ class MIDIGenerator:
             traceback.print_exc()
             return None
     
-    def _create_improved_midi(self, original_midi, analysis, user_preferences):
-        """Create improved MIDI using mido directly for better compatibility"""
+    def _create_improved_midi(self, original_data, analysis, user_preferences, seed=None, chord_timeline=None):
+        """Create improved MIDI bytes: original tracks plus encoded accompaniment tracks"""
         try:
             user_goals = user_preferences.get('goals', [])
             target_genre = user_preferences.get('target_genre', '')
@@ -48,46 +73,54 @@ class MIDIGenerator:
             print(f"Selected instruments: {selected_instruments}")
             print(f"Duration option: {duration_option}")
             
-            # Create new MIDI file - use type 1 to support multiple tracks
-            improved_midi = mido.MidiFile(type=1, ticks_per_beat=original_midi.ticks_per_beat)
+            _, _, ticks_per_beat = smf_reader.read_header(io.BytesIO(original_data))
             
-            # Copy original tracks and extend duration if needed
-            duration_multiplier = self._get_duration_multiplier(duration_option, user_preferences)
+            # Only a length change needs the song's timing; otherwise nothing is decoded
+            tempo_map, track_end_ticks, end_tick = None, [], 0
+            if duration_option != 'original':
+                _, tempo_changes, track_end_ticks = smf_reader.read_timing(io.BytesIO(original_data))
+                end_tick = max(track_end_ticks, default=0)
+                tempo_map = TempoMap(tempo_changes, ticks_per_beat)
+            duration_multiplier = self._get_duration_multiplier(duration_option, user_preferences, tempo_map, end_tick)
             
-            for track in original_midi.tracks:
-                new_track = mido.MidiTrack()
-                
-                # Copy original track
-                for msg in track:
-                    new_track.append(msg.copy())
-                
+            if len(original_data) * duration_multiplier > MAX_EXTENDED_BYTES:
+                raise ValueError(f'Extended MIDI would exceed {MAX_EXTENDED_BYTES // (1024 * 1024)} MB; choose a shorter duration')
+            
+            target_tick = None
+            if duration_multiplier > 1 and end_tick > 0:
+                target_tick = self._get_target_tick(duration_multiplier, tempo_map, end_tick)
+            
+            # Original MTrk chunks are spliced byte-for-byte into the new type 1 file
+            track_chunks = []
+            for index, chunk in enumerate(smf_reader.iter_track_chunks(original_data)):
                 # Extend track if needed
-                if duration_multiplier > 1:
-                    self._extend_track(new_track, original_midi, duration_multiplier)
+                if target_tick:
+                    chunk = self._extend_track(chunk, track_end_ticks[index], end_tick, target_tick)
                 
-                improved_midi.tracks.append(new_track)
+                track_chunks.append(chunk)
             
-            # Add improvements based on selected instruments
-            if 'bass' in selected_instruments and ('harmony' in user_goals or 'arrangement' in user_goals):
-                self._add_bass_track(improved_midi, analysis, target_genre)
+            # Add improvements based on selected instruments, all following the song's chords and bars
+            accompaniment = Accompaniment(analysis, ticks_per_beat, self.patterns, target_genre, target_tick, chord_timeline)
+            parts = [
+                part for part, goals in PART_GOALS.items()
+                if part in selected_instruments and (goals is None or any(goal in user_goals for goal in goals))
+            ]
             
-            if 'drums' in selected_instruments and 'rhythm' in user_goals:
-                self._add_drum_track(improved_midi, analysis, target_genre)
+            # Each part has its own seed, fixed by its place in PART_GOALS, so a part
+            # sounds the same whichever other parts are selected
+            part_seeds = dict(zip(PART_GOALS, np.random.SeedSequence(seed).spawn(len(PART_GOALS))))
             
-            if 'chords' in selected_instruments and ('harmony' in user_goals or 'arrangement' in user_goals):
-                self._add_chord_track(improved_midi, analysis, target_genre)
-                
-            if 'strings' in selected_instruments:
-                self._add_strings_track(improved_midi, analysis, target_genre)
-                
-            if 'lead' in selected_instruments and 'melody' in user_goals:
-                self._add_lead_track(improved_midi, analysis, target_genre)
-                
-            if 'pad' in selected_instruments and 'arrangement' in user_goals:
-                self._add_pad_track(improved_midi, analysis, target_genre)
+            # Parts are independent: build them concurrently and keep their chunks in PART_GOALS order
+            if len(parts) > 1:
+                futures = [self.executor.submit(self._build_part_track, accompaniment, part, part_seeds[part]) for part in parts]
+                new_chunks = [future.result() for future in futures]
+            else:
+                new_chunks = [self._build_part_track(accompaniment, part, part_seeds[part]) for part in parts]
+            
+            track_chunks.extend(chunk for chunk in new_chunks if chunk is not None)
             
-            print(f"Successfully created improved MIDI with {len(improved_midi.tracks)} tracks")
-            return improved_midi
+            print(f"Successfully created improved MIDI with {len(track_chunks)} tracks")
+            return smf_writer.write_file(track_chunks, ticks_per_beat)
             
         except Exception as e:
             print(f"Error creating improved MIDI: {e}")
@@ -95,102 +128,106 @@ class MIDIGenerator:
             traceback.print_exc()
             return None
     
-    def _add_bass_track(self, midi_file, analysis, target_genre):
-        """Add a simple bass track"""
-        try:
-            bass_track = mido.MidiTrack()
-            bass_track.append(mido.Message('program_change', channel=1, program=32, time=0))  # Bass program
-            
-            # Simple bass pattern - play root notes on beats
-            note = 36  # C2
-            duration = 480  # Quarter note at 480 ticks per beat
-            
-            # Add some bass notes
-            for i in range(8):  # 8 measures
-                bass_track.append(mido.Message('note_on', channel=1, note=note, velocity=80, time=0 if i == 0 else duration * 4))
-                bass_track.append(mido.Message('note_off', channel=1, note=note, velocity=0, time=duration))
-                
-                # Vary the bass note slightly
-                if i % 4 == 3:
-                    note += 5  # Go up a fourth
-                elif i % 2 == 1:
-                    note += 2  # Go up a whole step
-                else:
-                    note = 36  # Back to root
-            
-            midi_file.tracks.append(bass_track)
-            print("Added bass track")
-            
-        except Exception as e:
-            print(f"Error adding bass track: {e}")
+    def _get_duration_multiplier(self, duration_option, user_preferences, tempo_map, end_tick):
+        """How many times the original length the improved piece should last"""
+        if duration_option == 'extend_2x':
+            return 2
+        if duration_option == 'extend_4x':
+            return 4
+        if duration_option == 'custom':
+            try:
+                target_seconds = float(user_preferences.get('custom_duration', 60))
+            except (TypeError, ValueError):
+                return 1
+            if not target_seconds > 0:
+                return 1
+            
+            # Real playing time under the song's tempo map, not a 120 BPM guess
+            original_seconds = tempo_map.tick_to_seconds(end_tick)
+            if original_seconds <= 0:
+                return 1
+            return min(target_seconds / original_seconds, MAX_DURATION_MULTIPLIER)
+        return 1
     
-    def _add_drum_track(self, midi_file, analysis, target_genre):
-        """Add a simple drum track"""
-        try:
-            drum_track = mido.MidiTrack()
-            
-            # Create basic drum pattern
-            kick = 36
-            snare = 38
-            hihat = 42
-            
-            # Simple 4/4 pattern
-            pattern = [
-                (kick, 0, 120),      # Kick on beat 1
-                (hihat, 240, 80),    # Hi-hat on off-beat
-                (snare, 240, 100),   # Snare on beat 2
-                (hihat, 240, 80),    # Hi-hat
-                (kick, 240, 120),    # Kick on beat 3
-                (hihat, 240, 80),    # Hi-hat
-                (snare, 240, 100),   # Snare on beat 4
-                (hihat, 240, 80),    # Hi-hat
-            ]
-            
-            # Repeat pattern for several measures
-            for measure in range(4):
-                for drum_note, time_offset, velocity in pattern:
-                    drum_track.append(mido.Message('note_on', channel=9, note=drum_note, velocity=velocity, time=time_offset))
-                    drum_track.append(mido.Message('note_off', channel=9, note=drum_note, velocity=0, time=120))
-            
-            midi_file.tracks.append(drum_track)
-            print("Added drum track")
-            
-        except Exception as e:
-            print(f"Error adding drum track: {e}")
+    def _get_target_tick(self, duration_multiplier, tempo_map, end_tick):
+        """Tick where the extended piece ends; a fractional last pass is measured in real time"""
+        passes, fraction = divmod(duration_multiplier, 1)
+        target_tick = int(passes) * end_tick
+        if fraction:
+            # The last, partial pass replays the song from its start, under the song's own tempo map
+            target_tick += tempo_map.seconds_to_tick(fraction * tempo_map.tick_to_seconds(end_tick))
+        return target_tick
+    
+    def _extend_track(self, chunk, track_end, loop_ticks, target_tick):
+        """
+        Repeat a track every loop_ticks until target_tick by splicing its raw bytes.
+        
+        Only a final partial pass is decoded, to find where to cut it.
+        """
+        track_data = bytes(chunk[8:])
+        if not track_data.endswith(smf_writer.END_OF_TRACK[1:]):
+            return chunk
+        
+        # The end-of-track (keeping its delta) becomes a placeholder at track_end, and
+        # a second placeholder waits out the rest of the loop before the next pass
+        one_pass = track_data[:-3] + smf_writer.EMPTY_TEXT
+        gap = b''
+        if loop_ticks > track_end:
+            gap = smf_writer.encode_varlen(loop_ticks - track_end) + smf_writer.EMPTY_TEXT
+        
+        passes, remainder = divmod(target_tick, loop_ticks)
+        parts = [one_pass] + [gap + one_pass] * (passes - 1)
+        end_delta = 0
+        
+        if remainder >= track_end > 0:
+            parts.append(gap + one_pass)
+        elif remainder:
+            partial, end_delta = self._cut_track(track_data, remainder)
+            parts.append(gap + partial)
+        
+        return smf_writer.track_chunk(b''.join(parts), end_delta)
+    
+    def _cut_track(self, track_data, cut_tick):
+        """Events of a track before cut_tick, then all-notes-off on each channel it used"""
+        tick = 0
+        cut_offset = len(track_data)
+        last_tick = 0
+        channels = set()
+        
+        for offset, delta, status, data in smf_reader.iter_event_offsets(track_data):
+            if tick + delta >= cut_tick or (status == 0xFF and data[0] == smf_reader.META_END_OF_TRACK):
+                cut_offset = offset
+                break
+            tick += delta
+            last_tick = tick
+            if status < 0xF0:
+                channels.add(status & 0x0F)
+        
+        if not channels:
+            return track_data[:cut_offset], cut_tick - last_tick
+        
+        # Notes still sounding at the cut are released with controller 123 (all notes off)
+        notes_off = b''.join(
+            (smf_writer.encode_varlen(cut_tick - last_tick) if i == 0 else b'\x00') + bytes([0xB0 | channel, 123, 0])
+            for i, channel in enumerate(sorted(channels))
+        )
+        return track_data[:cut_offset] + notes_off, 0
     
-    def _add_chord_track(self, midi_file, analysis, target_genre):
-        """Add a simple chord accompaniment track"""
+    def _build_part_track(self, accompaniment, part, seed):
+        """Encode one accompaniment part as an MTrk chunk, or None if it fails"""
         try:
-            chord_track = mido.MidiTrack()
-            chord_track.append(mido.Message('program_change', channel=2, program=0, time=0))  # Piano
-            
-            # Simple chord progression
-            chords = [
-                [60, 64, 67],  # C major
-                [65, 69, 72],  # F major  
-                [67, 71, 74],  # G major
-                [60, 64, 67],  # C major
-            ]
-            
-            for i, chord in enumerate(chords):
-                time_offset = 0 if i == 0 else 1920  # Whole note duration
-                
-                # Play chord
-                for j, note in enumerate(chord):
-                    chord_track.append(mido.Message('note_on', channel=2, note=note, velocity=60, time=time_offset if j == 0 else 0))
-                
-                # Release chord after whole note
-                for note in chord:
-                    chord_track.append(mido.Message('note_off', channel=2, note=note, velocity=0, time=1920 if note == chord[0] else 0))
-            
-            midi_file.tracks.append(chord_track)
-            print("Added chord track")
+            chunk = smf_writer.encode_track(accompaniment.part_events(part, np.random.default_rng(seed)))
+            print(f"Added {part} track")
+            return chunk
             
         except Exception as e:
-            print(f"Error adding chord track: {e}")
+            print(f"Error adding {part} track: {e}")
+            return None
     
-    def _apply_improvements(self, score, analysis, recommendations, user_preferences):
+    def _apply_improvements(self, score, analysis, recommendations, user_preferences, rng):
         """Apply specific improvements based on analysis and recommendations"""
+        from music21 import stream
+
         user_goals = user_preferences.get('goals', [])
         target_genre = user_preferences.get('target_genre', '')
         
@@ -214,7 +251,7 @@ class MIDIGenerator:
         
         # Apply melody improvements
         if 'melody' in user_goals:
-            improved_score = self._improve_melody(improved_score, analysis, target_genre)
+            improved_score = self._improve_melody(improved_score, analysis, target_genre, rng)
         
         # Apply rhythm improvements
         if 'rhythm' in user_goals:
@@ -236,6 +273,8 @@ class MIDIGenerator:
     
     def _improve_harmony(self, score, analysis, target_genre):
         """Improve harmonic progression"""
+        from music21 import note, stream
+
         try:
             key_info = analysis.get('key_signature', {})
             song_key = key_info.get('key', 'C major').split()[0] if key_info.get('key') else 'C'
@@ -265,8 +304,10 @@ class MIDIGenerator:
             print(f"Error improving harmony: {e}")
             return score
     
-    def _improve_melody(self, score, analysis, target_genre):
+    def _improve_melody(self, score, analysis, target_genre, rng):
         """Improve melodic content"""
+        from music21 import note, stream
+
         try:
             melodic_info = analysis.get('melodic_analysis', {})
             key_info = analysis.get('key_signature', {})
@@ -295,7 +336,7 @@ class MIDIGenerator:
                     if isinstance(n, note.Note):
                         # Add a harmony note (third or fifth above)
                         melody_pitch_class = n.pitch.pitchClass
-                        harmony_interval = random.choice([2, 4])  # third or fifth
+                        harmony_interval = int(rng.choice([2, 4]))  # third or fifth
                         harmony_note_index = (scale_notes.index(self.note_names[melody_pitch_class]) + harmony_interval) % len(scale_notes)
                         harmony_pitch = scale_notes[harmony_note_index]
                         
@@ -313,6 +354,8 @@ class MIDIGenerator:
     
     def _improve_rhythm(self, score, analysis, target_genre):
         """Improve rhythmic elements"""
+        from music21 import note, stream
+
         try:
             # Add a simple drum/percussion track
             percussion_part = stream.Part()
@@ -346,6 +389,8 @@ class MIDIGenerator:
     
     def _improve_structure(self, score, analysis, target_genre):
         """Improve song structure"""
+        from music21 import note, stream
+
         try:
             # Add an intro and outro if missing
             structure_info = analysis.get('structure_analysis', {})
@@ -377,6 +422,8 @@ class MIDIGenerator:
     
     def _improve_arrangement(self, score, analysis, target_genre):
         """Improve overall arrangement"""
+        from music21 import chord, stream
+
         try:
             basic_info = analysis.get('basic_info', {})
             tracks = basic_info.get('tracks', 1)
@@ -465,42 +512,43 @@ class MIDIGenerator:
         return chord_symbols
     
     def _get_chord_root(self, chord_symbol, key):
-        """Get the root note of a chord"""
-        # Simple implementation - just return the first character
-        if chord_symbol:
-            return chord_symbol[0] + '2'  # Bass octave
-        return key + '2'
+        """Get the bass note of a chord"""
+        chord_value = parse_chord(chord_symbol)
+        if chord_value is None:
+            return key + '2'
+        return self.note_names[chord_value.bass_pitch_class] + '2'  # Bass octave
     
     def _get_chord_notes(self, chord_symbol, key):
-        """Get the notes of a chord"""
-        if not chord_symbol:
+        """Get the notes of a chord, stacked upwards from the root in octave 3"""
+        chord_value = parse_chord(chord_symbol)
+        if chord_value is None:
             return [key + '3', key + '4', key + '5']
         
-        root = chord_symbol[0]
-        if 'm' in chord_symbol:
-            # Minor chord
-            return [root + '3', root + '4', root + '5']
-        else:
-            # Major chord
-            return [root + '3', root + '4', root + '5']
+        notes = []
+        octave = 3
+        previous = None
+        for pitch_class in chord_value.pitch_classes:
+            if previous is not None and pitch_class <= previous:
+                octave += 1
+            notes.append(f'{self.note_names[pitch_class]}{octave}')
+            previous = pitch_class
+        return notes
     
     def _create_basic_beat(self):
         """Create a basic 4/4 beat pattern"""
-        return [(0, 'kick'), (1, 'snare'), (2, 'kick'), (3, 'snare')]
+        return list(DRUM_PATTERNS['basic'])
     
     def _create_rock_beat(self):
         """Create a rock beat pattern"""
-        return [(0, 'kick'), (0.5, 'hihat'), (1, 'snare'), (1.5, 'hihat'), 
-                (2, 'kick'), (2.5, 'hihat'), (3, 'snare'), (3.5, 'hihat')]
+        return list(DRUM_PATTERNS['rock'])
     
     def _create_jazz_beat(self):
         """Create a jazz beat pattern"""
-        return [(0, 'kick'), (0.67, 'hihat'), (1.33, 'snare'), (2, 'kick'), 
-                (2.67, 'hihat'), (3.33, 'snare')]
+        return list(DRUM_PATTERNS['jazz'])
     
     def _create_pop_beat(self):
         """Create a pop beat pattern"""
-        return [(0, 'kick'), (1, 'snare'), (2, 'kick'), (2.5, 'kick'), (3, 'snare')]
+        return list(DRUM_PATTERNS['pop'])
     
     def _export_to_midi(self, score):
         """Export the improved score to MIDI bytes"""
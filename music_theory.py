@@ -2,11 +2,153 @@
 Music theory utilities for analysis and recommendations
 """
 
+from types import MappingProxyType
+from chord_symbols import parse_chord, pitch_class
+
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+NOTE_INDEX = MappingProxyType({name: index for index, name in enumerate(NOTE_NAMES)})
+
+MODE_INTERVALS = MappingProxyType({
+    'major': (0, 2, 4, 5, 7, 9, 11),
+    'ionian': (0, 2, 4, 5, 7, 9, 11),
+    'dorian': (0, 2, 3, 5, 7, 9, 10),
+    'phrygian': (0, 1, 3, 5, 7, 8, 10),
+    'lydian': (0, 2, 4, 6, 7, 9, 11),
+    'mixolydian': (0, 2, 4, 5, 7, 9, 10),
+    'minor': (0, 2, 3, 5, 7, 8, 10),
+    'aeolian': (0, 2, 3, 5, 7, 8, 10),
+    'locrian': (0, 1, 3, 5, 6, 8, 10),
+    'harmonic_minor': (0, 2, 3, 5, 7, 8, 11),
+    'melodic_minor': (0, 2, 3, 5, 7, 9, 11),
+})
+
+# Modes whose tonic triad is major share the major-key functions; the rest use minor's
+MAJOR_LIKE_MODES = frozenset(['major', 'ionian', 'lydian', 'mixolydian'])
+
+TRIAD_QUALITIES = MappingProxyType({
+    (4, 7): 'major',
+    (3, 7): 'minor',
+    (3, 6): 'diminished',
+    (4, 8): 'augmented',
+})
+
+SEVENTH_QUALITIES = MappingProxyType({
+    (4, 7, 11): 'major seventh',
+    (4, 7, 10): 'dominant seventh',
+    (3, 7, 10): 'minor seventh',
+    (3, 7, 11): 'minor-major seventh',
+    (3, 6, 10): 'half-diminished seventh',
+    (3, 6, 9): 'diminished seventh',
+    (4, 8, 11): 'augmented major seventh',
+})
+
+MAJOR_FUNCTIONS = ('Tonic', 'Subdominant', 'Tonic', 'Subdominant', 'Dominant', 'Tonic', 'Dominant')
+MINOR_FUNCTIONS = ('Tonic', 'Subdominant', 'Dominant/Tonic', 'Subdominant', 'Dominant', 'Subdominant', 'Subtonic')
+
+# Common progressions from each scale degree
+COMMON_MOVEMENTS = (
+    (0, (3, 4, 5)),  # I -> IV, V, vi
+    (1, (4, 0)),     # ii -> V, I
+    (2, (5, 3)),     # iii -> vi, IV
+    (3, (0, 1, 4)),  # IV -> I, ii, V
+    (4, (0, 5)),     # V -> I, vi
+    (5, (3, 4, 0)),  # vi -> IV, V, I
+    (6, (0, 4)),     # vii -> I, V
+)
+
+STRONG_PROGRESSIONS = (
+    (4, 0),  # V-I (dominant to tonic)
+    (3, 0),  # IV-I (subdominant to tonic)
+    (1, 4),  # ii-V
+    (5, 3),  # vi-IV
+)
+
+MODERATE_PROGRESSIONS = (
+    (0, 3),  # I-IV
+    (0, 5),  # I-vi
+    (3, 4),  # IV-V
+    (5, 4),  # vi-V
+)
+
+
+def _scale_mode(mode):
+    """Modes other than the known ones are treated as natural minor"""
+    return mode if mode in MODE_INTERVALS else 'minor'
+
+
+def _stacked_intervals(intervals, degree, count):
+    """Intervals above a degree's root when stacking thirds inside the scale"""
+    root = intervals[degree]
+    return tuple((intervals[(degree + 2 * step) % 7] - root) % 12 for step in range(1, count))
+
+
+def _build_progression_strengths():
+    table = [['Weak'] * 7 for _ in range(7)]
+    for from_degree, to_degree in MODERATE_PROGRESSIONS:
+        table[from_degree][to_degree] = 'Moderate'
+    for from_degree, to_degree in STRONG_PROGRESSIONS:
+        table[from_degree][to_degree] = 'Strong'
+    return tuple(tuple(row) for row in table)
+
+
+PROGRESSION_STRENGTHS = _build_progression_strengths()
+
+# Per mode: triad and seventh quality and harmonic function of each scale degree
+DIATONIC_TRIADS = MappingProxyType({
+    mode: tuple(TRIAD_QUALITIES.get(_stacked_intervals(intervals, degree, 3), 'other') for degree in range(7))
+    for mode, intervals in MODE_INTERVALS.items()
+})
+DIATONIC_SEVENTHS = MappingProxyType({
+    mode: tuple(SEVENTH_QUALITIES.get(_stacked_intervals(intervals, degree, 4), 'other') for degree in range(7))
+    for mode, intervals in MODE_INTERVALS.items()
+})
+CHORD_FUNCTIONS = MappingProxyType({
+    mode: MAJOR_FUNCTIONS if mode in MAJOR_LIKE_MODES else MINOR_FUNCTIONS
+    for mode in MODE_INTERVALS
+})
+
+# Every root x mode, built once at import
+SCALE_NOTES = MappingProxyType({
+    (root, mode): tuple(NOTE_NAMES[(NOTE_INDEX[root] + interval) % 12] for interval in intervals)
+    for root in NOTE_NAMES
+    for mode, intervals in MODE_INTERVALS.items()
+})
+SCALE_CHORDS = MappingProxyType({
+    (root, mode): tuple(f"{SCALE_NOTES[(root, mode)][degree]} {DIATONIC_TRIADS[mode][degree]}" for degree in range(7))
+    for root in NOTE_NAMES
+    for mode in MODE_INTERVALS
+})
+SCALE_SEVENTH_CHORDS = MappingProxyType({
+    (root, mode): tuple(f"{SCALE_NOTES[(root, mode)][degree]} {DIATONIC_SEVENTHS[mode][degree]}" for degree in range(7))
+    for root in NOTE_NAMES
+    for mode in MODE_INTERVALS
+})
+
+
+def _build_next_chord_suggestions():
+    suggestions = {}
+    for (root, mode), chords in SCALE_CHORDS.items():
+        functions = CHORD_FUNCTIONS[mode]
+        suggestions[(root, mode)] = tuple(
+            MappingProxyType({
+                'chord': chords[next_degree],
+                'function': functions[next_degree],
+                'strength': PROGRESSION_STRENGTHS[degree][next_degree]
+            })
+            for degree, movements in COMMON_MOVEMENTS
+            for next_degree in movements
+        )[:5]  # Top 5 suggestions
+    return MappingProxyType(suggestions)
+
+
+NEXT_CHORD_SUGGESTIONS = _build_next_chord_suggestions()
+
+
 class MusicTheoryHelper:
     def __init__(self):
-        self.note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        self.major_scale_intervals = [0, 2, 4, 5, 7, 9, 11]
-        self.minor_scale_intervals = [0, 2, 3, 5, 7, 8, 10]
+        self.note_names = NOTE_NAMES
+        self.major_scale_intervals = MODE_INTERVALS['major']
+        self.minor_scale_intervals = MODE_INTERVALS['minor']
         
         # Common chord progressions in major keys (using Roman numerals as indices)
         self.common_progressions = {
@@ -17,150 +159,55 @@ class MusicTheoryHelper:
         }
         
         # Scale degrees for chord suggestions
-        self.major_chords = {
-            0: 'major',   # I
-            1: 'minor',   # ii
-            2: 'minor',   # iii
-            3: 'major',   # IV
-            4: 'major',   # V
-            5: 'minor',   # vi
-            6: 'diminished'  # vii°
-        }
-        
-        self.minor_chords = {
-            0: 'minor',   # i
-            1: 'diminished',  # ii°
-            2: 'major',   # III
-            3: 'minor',   # iv
-            4: 'minor',   # v
-            5: 'major',   # VI
-            6: 'major'    # VII
-        }
+        self.major_chords = dict(enumerate(DIATONIC_TRIADS['major']))
+        self.minor_chords = dict(enumerate(DIATONIC_TRIADS['minor']))
     
     def get_scale_notes(self, root_note, mode='major'):
-        """Get notes in a scale given the root note and mode"""
-        if root_note not in self.note_names:
-            return []
-        
-        root_index = self.note_names.index(root_note)
-        intervals = self.major_scale_intervals if mode == 'major' else self.minor_scale_intervals
-        
-        scale_notes = []
-        for interval in intervals:
-            note_index = (root_index + interval) % 12
-            scale_notes.append(self.note_names[note_index])
-        
-        return scale_notes
+        """Get notes in a scale given the root note and mode, as a new list"""
+        return list(SCALE_NOTES.get((root_note, _scale_mode(mode)), ()))
     
     def get_chord_from_scale_degree(self, root_note, scale_degree, mode='major'):
         """Get chord based on scale degree (0-6)"""
-        scale_notes = self.get_scale_notes(root_note, mode)
-        if not scale_notes or scale_degree >= len(scale_notes):
+        chords = SCALE_CHORDS.get((root_note, _scale_mode(mode)))
+        if not chords or not 0 <= scale_degree < 7:
             return None
-        
-        chord_root = scale_notes[scale_degree]
-        chord_type = self.major_chords[scale_degree] if mode == 'major' else self.minor_chords[scale_degree]
-        
-        return f"{chord_root} {chord_type}"
+        return chords[scale_degree]
+    
+    def get_seventh_chord_from_scale_degree(self, root_note, scale_degree, mode='major'):
+        """Get the diatonic seventh chord on a scale degree (0-6)"""
+        chords = SCALE_SEVENTH_CHORDS.get((root_note, _scale_mode(mode)))
+        if not chords or not 0 <= scale_degree < 7:
+            return None
+        return chords[scale_degree]
     
     def suggest_next_chords(self, current_chord, key, mode='major'):
-        """Suggest next chords based on music theory"""
-        suggestions = []
-        
-        # Get scale notes
-        scale_notes = self.get_scale_notes(key, mode)
-        if not scale_notes:
-            return suggestions
-        
-        # Common progressions from each scale degree
-        common_movements = {
-            0: [3, 4, 5],  # I -> IV, V, vi
-            1: [4, 0],     # ii -> V, I
-            2: [5, 3],     # iii -> vi, IV
-            3: [0, 1, 4],  # IV -> I, ii, V
-            4: [0, 5],     # V -> I, vi
-            5: [3, 4, 0],  # vi -> IV, V, I
-            6: [0, 4]      # vii -> I, V
-        }
-        
-        for degree, movements in common_movements.items():
-            for next_degree in movements:
-                chord = self.get_chord_from_scale_degree(key, next_degree, mode)
-                if chord:
-                    suggestions.append({
-                        'chord': chord,
-                        'function': self.get_chord_function(next_degree, mode),
-                        'strength': self.get_progression_strength(degree, next_degree)
-                    })
-        
-        return suggestions[:5]  # Return top 5 suggestions
+        """Suggest next chords based on music theory, as a new list of dicts"""
+        return [dict(suggestion) for suggestion in NEXT_CHORD_SUGGESTIONS.get((key, _scale_mode(mode)), ())]
     
     def get_chord_function(self, scale_degree, mode='major'):
         """Get the harmonic function of a chord"""
-        if mode == 'major':
-            functions = {
-                0: 'Tonic',
-                1: 'Subdominant',
-                2: 'Tonic',
-                3: 'Subdominant',
-                4: 'Dominant',
-                5: 'Tonic',
-                6: 'Dominant'
-            }
-        else:
-            functions = {
-                0: 'Tonic',
-                1: 'Subdominant',
-                2: 'Dominant/Tonic',
-                3: 'Subdominant',
-                4: 'Dominant',
-                5: 'Subdominant',
-                6: 'Subtonic'
-            }
-        
-        return functions.get(scale_degree, 'Unknown')
+        if not 0 <= scale_degree < 7:
+            return 'Unknown'
+        return CHORD_FUNCTIONS[_scale_mode(mode)][scale_degree]
     
     def get_progression_strength(self, from_degree, to_degree):
         """Rate the strength of a chord progression"""
-        # Strong progressions
-        strong_progressions = [
-            (4, 0),  # V-I (dominant to tonic)
-            (3, 0),  # IV-I (subdominant to tonic)
-            (1, 4),  # ii-V
-            (5, 3)   # vi-IV
-        ]
-        
-        # Moderate progressions
-        moderate_progressions = [
-            (0, 3),  # I-IV
-            (0, 5),  # I-vi
-            (3, 4),  # IV-V
-            (5, 4)   # vi-V
-        ]
-        
-        progression = (from_degree, to_degree)
-        
-        if progression in strong_progressions:
-            return 'Strong'
-        elif progression in moderate_progressions:
-            return 'Moderate'
-        else:
+        if not (0 <= from_degree < 7 and 0 <= to_degree < 7):
             return 'Weak'
+        return PROGRESSION_STRENGTHS[from_degree][to_degree]
     
     def analyze_chord_progression_quality(self, chords, key, mode='major'):
         """Analyze the quality of a chord progression"""
         if not chords:
             return {'quality': 'Unknown', 'suggestions': []}
         
-        scale_notes = self.get_scale_notes(key, mode)
-        
-        # Count functional movements
-        strong_movements = 0
-        total_movements = len(chords) - 1
+        from harmonic_function import analyze_functions, chord_ids_from_chords
         
-        for i in range(len(chords) - 1):
-            # Simplified analysis - this would need more sophisticated chord parsing
-            strong_movements += 1 if 'major' in chords[i].lower() or 'minor' in chords[i].lower() else 0
+        # Score every movement between scale degrees with the progression strength table
+        chord_ids = chord_ids_from_chords(parse_chord(chord) for chord in chords)
+        strengths = analyze_functions(chord_ids, pitch_class(key) or 0, mode)['strengths']
+        strong_movements = int((strengths > 0).sum())
+        total_movements = len(strengths)
         
         if total_movements == 0:
             quality = 'Single chord'
@@ -184,18 +231,20 @@ class MusicTheoryHelper:
         if len(chords) < 4:
             suggestions.append("Consider extending the progression to 4 or more chords for better flow")
         
-        if not any(key in chord for chord in chords):
+        roots = [chord.root if chord is not None else None for chord in map(parse_chord, chords)]
+        tonic = pitch_class(key)
+        
+        if tonic not in roots:
             suggestions.append(f"Consider starting or ending with the tonic chord ({key})")
         
         # Check for V-I resolution
         has_dominant_resolution = False
-        scale_notes = self.get_scale_notes(key, mode)
-        if len(scale_notes) >= 5:
-            dominant_note = scale_notes[4]
-            for i, chord in enumerate(chords[:-1]):
-                if dominant_note in chord and key in chords[i + 1]:
-                    has_dominant_resolution = True
-                    break
+        if tonic is not None:
+            dominant = (tonic + 7) % 12
+            has_dominant_resolution = any(
+                current == dominant and following == tonic
+                for current, following in zip(roots, roots[1:])
+            )
         
         if not has_dominant_resolution:
             suggestions.append("Consider adding a dominant to tonic resolution for stronger harmonic movement")
@@ -0,0 +1,180 @@
+"""
+Memoized one-bar accompaniment templates in chord-tone space, tiled into full parts
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# One note per row. Pitched parts give a chord tone (0 root, 1 third, 2 fifth, 3 seventh)
+# and the register of a C chord in 'pitch'; drums give tone -1 and the drum note itself.
+TEMPLATE_DTYPE = np.dtype([
+    ('onset', np.int64),
+    ('duration', np.int64),
+    ('tone', np.int8),
+    ('pitch', np.uint8),
+    ('velocity', np.uint8),
+])
+
+DRUM_NOTES = {'kick': 36, 'snare': 38, 'hihat': 42}
+DRUM_VELOCITIES = {'kick': 120, 'snare': 100, 'hihat': 80}
+
+# One 4/4 bar per genre as (beat position, drum)
+DRUM_PATTERNS = {
+    'basic': ((0, 'kick'), (1, 'snare'), (2, 'kick'), (3, 'snare')),
+    'rock': ((0, 'kick'), (0.5, 'hihat'), (1, 'snare'), (1.5, 'hihat'),
+             (2, 'kick'), (2.5, 'hihat'), (3, 'snare'), (3.5, 'hihat')),
+    'jazz': ((0, 'kick'), (0.67, 'hihat'), (1.33, 'snare'), (2, 'kick'),
+             (2.67, 'hihat'), (3.33, 'snare')),
+    'pop': ((0, 'kick'), (1, 'snare'), (2, 'kick'), (2.5, 'kick'), (3, 'snare')),
+}
+
+# Bass figures as (beat position, chord tone, length in beats)
+BASS_FIGURES = {
+    'basic': ((0, 0, 1), (2, 2, 1)),
+    'rock': tuple((beat / 2, 0, 0.5) for beat in range(8)),
+    'jazz': ((0, 0, 1), (1, 1, 1), (2, 2, 1), (3, 1, 1)),
+    'pop': ((0, 0, 1.5), (1.5, 0, 0.5), (2, 2, 1)),
+}
+
+# Chord strikes as (beat position, length in beats); None holds to the end of the bar
+CHORD_RHYTHMS = {
+    'basic': ((0, None),),
+    'rock': ((0, 2), (2, None)),
+    'jazz': ((0, 1.5), (1.5, None)),
+    'pop': ((0, 1), (1, 1), (2, 1), (3, None)),
+}
+
+# Lead figures as (beat position, chord tone, length in beats): arpeggios over the chord
+LEAD_FIGURES = {
+    'basic': ((0, 0, 1), (1, 1, 1), (2, 2, 1), (3, 1, 1)),
+    'rock': ((0, 2, 1.5), (1.5, 0, 0.5), (2, 2, 1), (3, 3, 1)),
+    'jazz': tuple((beat / 2, (0, 1, 2, 3, 2, 1, 0, 1)[beat], 0.5) for beat in range(8)),
+    'pop': ((0, 2, 1), (1, 1, 0.5), (1.5, 0, 1.5), (3, 1, 1)),
+}
+
+BASS_REGISTER = 36     # C2
+STRINGS_REGISTER = 48  # C3
+CHORD_REGISTER = 60    # C4
+PAD_REGISTER = 60      # C4
+LEAD_REGISTER = 72     # C5
+
+
+def bar_ticks(ticks_per_beat, meter):
+    numerator, denominator = meter
+    return ticks_per_beat * numerator * 4 // denominator
+
+
+def tile_notes(template, cycle_ticks, count):
+    """Repeat a one-cycle template `count` times, offsetting each copy by cycle_ticks"""
+    tiled = np.tile(template, count)
+    tiled['onset'] += np.repeat(np.arange(count, dtype=np.int64) * cycle_ticks, len(template))
+    return tiled
+
+
+def _template(rows):
+    return np.array(sorted(rows), dtype=TEMPLATE_DTYPE)
+
+
+def _bass_pattern(genre, ticks_per_beat, meter):
+    numerator = meter[0]
+    beat = bar_ticks(ticks_per_beat, meter) // numerator
+    return _template(
+        (round(position * beat), round(length * beat), tone, BASS_REGISTER, 80)
+        for position, tone, length in BASS_FIGURES[genre] if position < numerator
+    )
+
+
+def _drum_pattern(genre, ticks_per_beat, meter):
+    numerator = meter[0]
+    beat = bar_ticks(ticks_per_beat, meter) // numerator
+    return _template(
+        (round(position * beat), ticks_per_beat // 4, -1, DRUM_NOTES[drum], DRUM_VELOCITIES[drum])
+        for position, drum in DRUM_PATTERNS[genre] if position < numerator
+    )
+
+
+def _chord_pattern(genre, ticks_per_beat, meter):
+    numerator = meter[0]
+    bar = bar_ticks(ticks_per_beat, meter)
+    beat = bar // numerator
+
+    rows = []
+    for position, length in CHORD_RHYTHMS[genre]:
+        if position >= numerator:
+            continue
+        onset = round(position * beat)
+        duration = bar - onset if length is None else round(length * beat)
+        rows.extend((onset, duration, tone, CHORD_REGISTER, 60) for tone in range(4))
+    return _template(rows)
+
+
+def _strings_pattern(genre, ticks_per_beat, meter):
+    """Root, fifth and third an octave up, held through the bar"""
+    bar = bar_ticks(ticks_per_beat, meter)
+    return _template([
+        (0, bar, 0, STRINGS_REGISTER, 55),
+        (0, bar, 2, STRINGS_REGISTER, 50),
+        (0, bar, 1, STRINGS_REGISTER + 12, 50),
+    ])
+
+
+def _lead_pattern(genre, ticks_per_beat, meter):
+    numerator = meter[0]
+    beat = bar_ticks(ticks_per_beat, meter) // numerator
+    return _template(
+        (round(position * beat), round(length * beat), tone, LEAD_REGISTER, 90)
+        for position, tone, length in LEAD_FIGURES[genre] if position < numerator
+    )
+
+
+def _pad_pattern(genre, ticks_per_beat, meter):
+    """Soft third, fifth and seventh (or octave) sustained under everything"""
+    bar = bar_ticks(ticks_per_beat, meter)
+    return _template([(0, bar, tone, PAD_REGISTER, 40) for tone in (1, 2, 3)])
+
+
+PATTERN_BUILDERS = {
+    'bass': _bass_pattern,
+    'drums': _drum_pattern,
+    'chords': _chord_pattern,
+    'strings': _strings_pattern,
+    'lead': _lead_pattern,
+    'pad': _pad_pattern,
+}
+
+
+class PatternLibrary:
+    """LRU cache of read-only one-bar templates keyed by (part, genre, ticks_per_beat, meter)"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, part, genre, ticks_per_beat, meter):
+        """Return the template notes for one bar of a part"""
+        genre = genre if genre in DRUM_PATTERNS else 'basic'
+        cache_key = (part, genre, ticks_per_beat, tuple(meter))
+
+        with self._lock:
+            template = self._templates.get(cache_key)
+            if template is not None:
+                self._templates.move_to_end(cache_key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = PATTERN_BUILDERS[part](genre, ticks_per_beat, meter)
+        template.flags.writeable = False
+
+        with self._lock:
+            self._templates[cache_key] = template
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._templates), 'hits': self.hits, 'misses': self.misses}
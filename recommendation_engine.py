@@ -1,5 +1,7 @@
 from music_theory import MusicTheoryHelper
-import random
+
+# Bump whenever recommendation output changes so cached recommendations are not reused
+RECOMMENDER_VERSION = 1
 
 class RecommendationEngine:
     def __init__(self):
@@ -0,0 +1,237 @@
+"""
+Bounded stores for generated MIDI downloads: an in-memory LRU or an expiring disk directory
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+RESULT_FILE_PATTERN = re.compile(r'^improved_([0-9a-f-]{36})\.mid$')
+
+
+def _valid_id(result_id):
+    """Whether result_id is one of our UUIDs (never a path fragment)"""
+    try:
+        return str(uuid.UUID(result_id)) == result_id
+    except (TypeError, ValueError):
+        return False
+
+
+class MemoryResultStore:
+    """LRU of result bytes bounded by a total byte budget"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, data, result_id=None):
+        """Store result bytes under result_id (a new download id by default) and return it, or None if they exceed the budget"""
+        if len(data) > self.max_bytes:
+            return None
+
+        result_id = result_id or str(uuid.uuid4())
+        with self._lock:
+            previous = self._entries.pop(result_id, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[result_id] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+        return result_id
+
+    def get(self, result_id):
+        """Result bytes, or None if unknown or evicted"""
+        with self._lock:
+            data = self._entries.get(result_id)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(result_id)
+            self.hits += 1
+            return data
+
+    def delete(self, result_id):
+        """Drop a result; returns whether it was stored"""
+        with self._lock:
+            data = self._entries.pop(result_id, None)
+            if data is None:
+                return False
+            self._size -= len(data)
+            return True
+
+    def stats(self):
+        """Report store occupancy, hit and eviction counts"""
+        with self._lock:
+            return {
+                'kind': 'memory',
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskResultStore:
+    """
+    Result files in a directory, expired after a TTL by a background sweeper and bounded in total size.
+
+    The directory is the only record of what is stored, so several processes (such as
+    gunicorn workers) sharing it see each other's results, expiry and size budget.
+    """
+
+    def __init__(self, directory, ttl=3600, max_bytes=1024 * 1024 * 1024, sweep_interval=60):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Daemon thread so abandoned results are removed even when nobody asks for them
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, args=(sweep_interval,), name='result-sweeper', daemon=True
+        )
+        self._sweeper.start()
+
+    def put(self, data):
+        """Write result bytes and return their download id, or None if they exceed the size bound"""
+        if len(data) > self.max_bytes:
+            return None
+
+        result_id = str(uuid.uuid4())
+        path = self._path(result_id)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        # Atomic rename so a download never sees a partial file
+        os.replace(temp_path, path)
+
+        # Oldest results go first once the directory as a whole is over budget
+        results = self._scan()
+        total = sum(size for _, _, size in results)
+        evicted = []
+        for _, evicted_id, size in sorted(results):
+            if total <= self.max_bytes:
+                break
+            if evicted_id != result_id:
+                evicted.append(evicted_id)
+                total -= size
+
+        removed = self._remove_files(evicted)
+        with self._lock:
+            self.evictions += removed
+        return result_id
+
+    def get(self, result_id):
+        """Result bytes, or None if unknown, expired or evicted"""
+        data = None
+        if _valid_id(result_id):
+            try:
+                with open(self._path(result_id), 'rb') as f:
+                    if time.time() - os.fstat(f.fileno()).st_mtime <= self.ttl:
+                        data = f.read()
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def delete(self, result_id):
+        """Remove a result; returns whether it was stored"""
+        if not _valid_id(result_id):
+            return False
+        return self._remove_files([result_id]) == 1
+
+    def sweep(self):
+        """Remove every result older than the TTL; returns how many were removed"""
+        cutoff = time.time() - self.ttl
+        expired = [result_id for modified, result_id, _ in self._scan() if modified < cutoff]
+        removed = self._remove_files(expired)
+        with self._lock:
+            self.expirations += removed
+        return removed
+
+    def stats(self):
+        """Report store occupancy, and this process's hit, eviction and expiry counts"""
+        results = self._scan()
+        with self._lock:
+            return {
+                'kind': 'disk',
+                'entries': len(results),
+                'bytes': sum(size for _, _, size in results),
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def close(self):
+        """Stop the sweeper; stored files stay and are picked up again on restart"""
+        self._stop.set()
+
+    def _path(self, result_id):
+        return os.path.join(self.directory, f'improved_{result_id}.mid')
+
+    def _scan(self):
+        """(modified time, result id, size) of every result file in the directory"""
+        results = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                match = RESULT_FILE_PATTERN.match(entry.name)
+                if not match:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Removed by another process since the listing
+                    continue
+                results.append((stat.st_mtime, match.group(1), stat.st_size))
+        return results
+
+    def _remove_files(self, result_ids):
+        """Delete result files; returns how many this call removed"""
+        removed = 0
+        for result_id in result_ids:
+            try:
+                os.remove(self._path(result_id))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Result store delete error: {e}")
+        return removed
+
+    def _sweep_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Result store sweep error: {e}")
@@ -0,0 +1,183 @@
+"""
+Incremental Standard MIDI File reader that never holds a whole track in memory
+"""
+import io
+import struct
+
+# Data bytes following each channel message status (high nibble)
+CHANNEL_DATA_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+
+META_END_OF_TRACK = 0x2F
+META_SET_TEMPO = 0x51
+META_TIME_SIGNATURE = 0x58
+
+
+class _BlockReader:
+    """Reads a byte range of a file in fixed-size blocks"""
+
+    def __init__(self, fp, length, block_size):
+        self.fp = fp
+        self.length = length
+        self.remaining = length
+        self.block_size = block_size
+        self.buffer = b''
+        self.pos = 0
+
+    def _fill(self, needed):
+        available = len(self.buffer) - self.pos
+        if available >= needed:
+            return
+        chunk = self.fp.read(min(self.remaining, max(self.block_size, needed - available)))
+        self.remaining -= len(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        if len(self.buffer) < needed:
+            raise EOFError('MIDI track ended in the middle of an event')
+
+    def offset(self):
+        """Bytes of the track consumed so far"""
+        return self.length - self.remaining - (len(self.buffer) - self.pos)
+
+    def at_end(self):
+        return self.pos >= len(self.buffer) and self.remaining <= 0
+
+    def byte(self):
+        self._fill(1)
+        value = self.buffer[self.pos]
+        self.pos += 1
+        return value
+
+    def read(self, size):
+        self._fill(size)
+        data = self.buffer[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def varlen(self):
+        value = 0
+        while True:
+            byte = self.byte()
+            value = (value << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                return value
+
+    def skip_rest(self):
+        self.pos = len(self.buffer)
+        while self.remaining > 0:
+            self.remaining -= len(self.fp.read(min(self.remaining, self.block_size)))
+
+
+def read_header(fp):
+    """Read the MThd chunk and return (format, track_count, ticks_per_beat)"""
+    chunk_type, length = struct.unpack('>4sL', fp.read(8))
+    if chunk_type != b'MThd' or length < 6:
+        raise ValueError('Not a Standard MIDI File')
+    midi_format, track_count, division = struct.unpack('>HHH', fp.read(6))
+    fp.read(length - 6)
+    if division & 0x8000:
+        raise ValueError('SMPTE time division is not supported')
+    return midi_format, track_count, division
+
+
+def iter_tracks(fp):
+    """Yield (track_index, length) for each MTrk chunk, skipping unknown chunks"""
+    track_index = 0
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+        chunk_type, length = struct.unpack('>4sL', header)
+        if chunk_type != b'MTrk':
+            fp.seek(length, 1)
+            continue
+        yield track_index, length
+        track_index += 1
+
+
+def iter_track_events(fp, length, block_size=65536):
+    """
+    Yield (delta, status, data) for every event in the current track chunk.
+
+    Channel messages give data as (data1, data2); meta events give status 0xFF
+    and data as (meta_type, payload). Sysex events are skipped.
+    """
+    for _, delta, status, data in _iter_events(_BlockReader(fp, length, block_size)):
+        yield delta, status, data
+
+
+def iter_event_offsets(track_data):
+    """Like iter_track_events over in-memory track data, also yielding each event's byte offset first"""
+    return _iter_events(_BlockReader(io.BytesIO(track_data), len(track_data), len(track_data)))
+
+
+def _iter_events(reader):
+    running_status = None
+    pending_delta = 0
+    event_offset = None
+
+    while not reader.at_end():
+        if event_offset is None:
+            event_offset = reader.offset()
+        delta = pending_delta + reader.varlen()
+        pending_delta = 0
+        status = reader.byte()
+
+        if status < 0x80:
+            # Running status: this byte is the first data byte
+            if running_status is None:
+                raise ValueError('Running status without a previous status byte')
+            first = status
+            status = running_status
+        else:
+            first = None
+
+        if status == 0xFF:
+            meta_type = reader.byte()
+            payload = reader.read(reader.varlen())
+            yield event_offset, delta, status, (meta_type, payload)
+            event_offset = None
+            if meta_type == META_END_OF_TRACK:
+                reader.skip_rest()
+                return
+        elif status in (0xF0, 0xF7):
+            # Skipped sysex: its delta carries over, and the next event is reported from here
+            reader.read(reader.varlen())
+            running_status = None
+            pending_delta = delta
+        else:
+            running_status = status
+            data_length = CHANNEL_DATA_LENGTHS[status & 0xF0]
+            if first is None:
+                first = reader.byte()
+            second = reader.byte() if data_length == 2 else 0
+            yield event_offset, delta, status, (first, second)
+            event_offset = None
+
+
+def iter_track_chunks(data):
+    """Yield each complete MTrk chunk of in-memory SMF bytes as a zero-copy memoryview"""
+    view = memoryview(data)
+    position = 8 + struct.unpack('>L', view[4:8])[0]
+    while position + 8 <= len(view):
+        chunk_type, length = struct.unpack('>4sL', view[position:position + 8])
+        end = position + 8 + length
+        if end > len(view):
+            raise EOFError('MIDI track chunk is truncated')
+        if chunk_type == b'MTrk':
+            yield view[position:end]
+        position = end
+
+
+def read_timing(fp, block_size=65536):
+    """Scan a whole file for its timing: (ticks_per_beat, [(tick, tempo), ...], [end tick of each track])"""
+    _, _, ticks_per_beat = read_header(fp)
+    tempo_changes = []
+    track_end_ticks = []
+    for _, length in iter_tracks(fp):
+        tick = 0
+        for delta, status, data in iter_track_events(fp, length, block_size):
+            tick += delta
+            if status == 0xFF and data[0] == META_SET_TEMPO and len(data[1]) == 3:
+                tempo_changes.append((tick, int.from_bytes(data[1], 'big')))
+        track_end_ticks.append(tick)
+    return ticks_per_beat, tempo_changes, track_end_ticks
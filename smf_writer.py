@@ -0,0 +1,126 @@
+"""
+Standard MIDI File encoder writing array-backed event lists straight to bytes
+"""
+import struct
+import numpy as np
+from smf_reader import CHANNEL_DATA_LENGTHS
+
+# One channel message per row; absolute ticks are turned into delta-times on encode
+EVENT_DTYPE = np.dtype([
+    ('tick', np.int64),
+    ('status', np.uint8),
+    ('data1', np.uint8),
+    ('data2', np.uint8),
+])
+
+END_OF_TRACK = b'\x00\xff\x2f\x00'
+EMPTY_TEXT = b'\xff\x01\x00'  # Zero-length text meta event, used as a timing placeholder
+MAX_DELTA = 0x0FFFFFFF  # Largest value a four-byte variable-length quantity can hold
+
+# Data bytes per status byte, indexed by the status byte itself
+_DATA_LENGTHS = np.zeros(256, dtype=np.int64)
+for _kind, _length in CHANNEL_DATA_LENGTHS.items():
+    _DATA_LENGTHS[_kind:_kind + 16] = _length
+
+
+def note_events(onsets, durations, pitches, velocities, channel):
+    """Note-on/note-off pairs for arrays of notes; note-offs are note-ons at velocity 0 for running status"""
+    onsets = np.asarray(onsets, dtype=np.int64)
+    count = len(onsets)
+    events = np.empty(2 * count, dtype=EVENT_DTYPE)
+
+    events['tick'][:count] = onsets
+    events['tick'][count:] = onsets + np.maximum(np.asarray(durations, dtype=np.int64), 1)
+    events['status'] = 0x90 | channel
+    events['data1'][:count] = pitches
+    events['data1'][count:] = pitches
+    events['data2'][:count] = velocities
+    events['data2'][count:] = 0
+    return events
+
+
+def program_change(channel, program, tick=0):
+    """A single program change event"""
+    return np.array([(tick, 0xC0 | channel, program, 0)], dtype=EVENT_DTYPE)
+
+
+def _event_order(events):
+    """Sort rank at equal ticks: controller/program changes, then note-offs, then note-ons"""
+    kind = events['status'] & 0xF0
+    note_on = (kind == 0x90) & (events['data2'] > 0)
+    note_off = (kind == 0x80) | ((kind == 0x90) & (events['data2'] == 0))
+    return np.where(note_on, 2, np.where(note_off, 1, 0))
+
+
+def encode_events(events):
+    """
+    Encode channel events as SMF track data (without chunk header or end of track).
+
+    Events may be in any order. Delta-times, running status and the output buffer
+    are all computed as whole-array operations.
+    """
+    if not len(events):
+        return b''
+    events = events[np.lexsort((_event_order(events), events['tick']))]
+
+    ticks = events['tick']
+    deltas = np.diff(ticks, prepend=0)
+    if deltas[0] < 0 or deltas.max() > MAX_DELTA:
+        raise ValueError('Event ticks must be non-negative and within MIDI delta-time range')
+
+    status = events['status'].astype(np.int64)
+    data_lengths = _DATA_LENGTHS[status]
+    if not data_lengths.all():
+        raise ValueError('Only channel messages can be encoded as events')
+
+    # Running status: the status byte is only written when it changes
+    write_status = np.concatenate(([True], status[1:] != status[:-1]))
+
+    varlen_lengths = 1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    sizes = varlen_lengths + write_status + data_lengths
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    buffer = np.zeros(int(sizes.sum()), dtype=np.uint8)
+
+    # Variable-length delta: 7 bits per byte, most significant first, continuation bit on all but the last
+    for byte_index in range(4):
+        has_byte = varlen_lengths > byte_index
+        shift = 7 * (varlen_lengths[has_byte] - 1 - byte_index)
+        continuation = np.where(byte_index < varlen_lengths[has_byte] - 1, 0x80, 0)
+        buffer[starts[has_byte] + byte_index] = ((deltas[has_byte] >> shift) & 0x7F) | continuation
+
+    position = starts + varlen_lengths
+    buffer[position[write_status]] = status[write_status]
+    position = position + write_status
+    buffer[position] = events['data1'] & 0x7F
+    two_bytes = data_lengths == 2
+    buffer[position[two_bytes] + 1] = events['data2'][two_bytes] & 0x7F
+
+    return buffer.tobytes()
+
+
+def encode_varlen(value):
+    """Variable-length quantity bytes for a delta-time or length"""
+    encoded = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        encoded.insert(0, (value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(encoded)
+
+
+def track_chunk(track_data, end_delta=0):
+    """Wrap encoded track data in an MTrk chunk terminated by an end-of-track event"""
+    end_of_track = encode_varlen(end_delta) + END_OF_TRACK[1:]
+    return b'MTrk' + struct.pack('>L', len(track_data) + len(end_of_track)) + track_data + end_of_track
+
+
+def encode_track(events):
+    """Complete MTrk chunk for an event array"""
+    return track_chunk(encode_events(events))
+
+
+def write_file(track_chunks, ticks_per_beat, midi_format=1):
+    """Join an MThd header and already-encoded MTrk chunks into a Standard MIDI File"""
+    header = b'MThd' + struct.pack('>LHHH', 6, midi_format, len(track_chunks), ticks_per_beat)
+    return b''.join([header] + list(track_chunks))
@@ -352,6 +352,11 @@ function handleFormSubmit(e) {
             formData.append('custom_duration', customDuration.value);
         }
         
+        const variationSeed = document.getElementById('variationSeed');
+        if (variationSeed && variationSeed.value) {
+            formData.append('seed', variationSeed.value);
+        }
+        
         // Add selected instruments
         const instrumentCheckboxes = document.querySelectorAll('input[name="instruments"]:checked');
         instrumentCheckboxes.forEach(checkbox => {
@@ -623,6 +628,14 @@ function displayHarmonyAnalysis(keyInfo, chordInfo) {
                     <div class="analysis-label">Detected Chords</div>
                     <div class="analysis-value">${chordsDisplay}</div>
                 </div>
+                <div class="analysis-item">
+                    <div class="analysis-label">Roman Numerals</div>
+                    <div class="analysis-value">${(chordInfo?.functional_harmony?.roman_numerals || []).join(' - ') || 'None detected'}</div>
+                </div>
+                <div class="analysis-item">
+                    <div class="analysis-label">Functional Strength</div>
+                    <div class="analysis-value">${Math.round((chordInfo?.functional_harmony?.functional_strength || 0) * 100)}%</div>
+                </div>
             </div>
         </div>
     `;
@@ -0,0 +1,283 @@
+"""
+Constant-memory analysis for very large or multi-hour MIDI files
+"""
+import io
+import traceback
+import numpy as np
+from midi_analyzer import MIDIAnalyzer
+from tempo_map import TempoMap
+from key_detection import detect_key_from_histogram, key_sections_from_histograms
+from chord_recognition import MAX_BEATS, chords_from_beat_masks
+import smf_reader
+
+# Quantized durations are only counted up to the point where complexity is settled
+MAX_TRACKED_DURATIONS = 64
+
+# Tempo changes kept for the tempo map; later ones are ignored so a file of tempo events stays bounded
+MAX_TRACKED_TEMPO_CHANGES = 10000
+
+
+class _TrackMelody:
+    """Running melody statistics for one track: top note per onset and its intervals"""
+
+    def __init__(self):
+        self.onset = None
+        self.top_pitch = None
+        self.previous = None
+        self.count = 0
+        self.pitch_sum = 0
+        self.lowest = 127
+        self.highest = 0
+        self.interval_sum = 0
+        self.first_intervals = []
+
+    def add(self, onset, pitch):
+        if onset != self.onset:
+            self.flush()
+            self.onset = onset
+            self.top_pitch = pitch
+        elif pitch > self.top_pitch:
+            self.top_pitch = pitch
+
+    def flush(self):
+        if self.top_pitch is None:
+            return
+        pitch = self.top_pitch
+        if self.previous is not None:
+            interval = pitch - self.previous
+            self.interval_sum += interval
+            if len(self.first_intervals) < 10:
+                self.first_intervals.append(interval)
+        self.previous = pitch
+        self.count += 1
+        self.pitch_sum += pitch
+        self.lowest = min(self.lowest, pitch)
+        self.highest = max(self.highest, pitch)
+        self.top_pitch = None
+
+
+class StreamingAnalyzer(MIDIAnalyzer):
+    """Analyzer that walks track events as a generator and updates running accumulators"""
+
+    def __init__(self, key_profile='krumhansl', block_size=65536):
+        super().__init__(key_profile=key_profile)
+        self.block_size = block_size
+
+    def analyze_file(self, filepath):
+        """Analyze a MIDI file on disk without loading it into memory"""
+        try:
+            with open(filepath, 'rb') as f:
+                return self.analyze_stream(f)
+        except Exception as e:
+            error_msg = f"Error reading MIDI file: {str(e)}"
+            print(error_msg)
+            return {'success': False, 'error': error_msg}
+
+    def analyze_data(self, data):
+        """Analyze MIDI file bytes, or a seekable binary buffer in place, with the same streaming passes"""
+        if hasattr(data, 'read'):
+            return self.analyze_stream(data)
+        return self.analyze_stream(io.BytesIO(data))
+
+    def analyze_stream(self, fp):
+        """Analyze a seekable binary stream holding a Standard MIDI File"""
+        try:
+            midi_format, _, tpb = smf_reader.read_header(fp)
+            state = self._new_state()
+
+            track_count = 0
+            for track_index, length in smf_reader.iter_tracks(fp):
+                track_count += 1
+                self._consume_track(state, fp, length, tpb)
+
+            analysis, chord_timeline = self._summarize(state, midi_format, track_count, tpb)
+            return {'success': True, 'analysis': analysis, 'chord_timeline': chord_timeline}
+
+        except Exception as e:
+            error_msg = f"Error analyzing MIDI file: {str(e)}"
+            print(error_msg)
+            print(traceback.format_exc())
+            return {'success': False, 'error': error_msg}
+
+    def _new_state(self):
+        return {
+            'pitch_counts': np.zeros(128, dtype=np.int64),
+            'pc_weights': np.zeros(12),
+            'velocity_sum': 0,
+            'durations': set(),
+            'tempo_changes': [],
+            'time_signature': None,
+            'beat_masks': np.zeros(1024, dtype=np.int16),
+            'beat_count': 0,
+            'key_window_ticks': None,
+            'key_histograms': np.zeros((16, 12)),
+            'key_window_count': 0,
+            'melodies': [],
+            'end_tick': 0
+        }
+
+    def _consume_track(self, state, fp, length, tpb):
+        """Fold one track's events into the accumulators"""
+        tick = 0
+        active = {}
+        melody = _TrackMelody()
+
+        for delta, status, data in smf_reader.iter_track_events(fp, length, self.block_size):
+            tick += delta
+            kind = status & 0xF0
+
+            if kind == 0x90 and data[1] > 0:
+                key = (status & 0x0F, data[0])
+                if key in active:
+                    active[key].append((tick, data[1]))
+                else:
+                    active[key] = [(tick, data[1])]
+                melody.add(tick, data[0])
+            elif kind == 0x80 or kind == 0x90:
+                started = active.get((status & 0x0F, data[0]))
+                if started:
+                    onset, velocity = started.pop(0)
+                    self._add_note(state, onset, tick - onset, data[0], velocity, tpb)
+            elif status == 0xFF:
+                meta_type, payload = data
+                if meta_type == smf_reader.META_SET_TEMPO and len(payload) == 3:
+                    if len(state['tempo_changes']) < MAX_TRACKED_TEMPO_CHANGES:
+                        state['tempo_changes'].append((tick, int.from_bytes(payload, 'big')))
+                elif meta_type == smf_reader.META_TIME_SIGNATURE and len(payload) >= 2:
+                    if state['time_signature'] is None or tick < state['time_signature'][0]:
+                        state['time_signature'] = (tick, payload[0], 2 ** payload[1])
+
+        # Notes still sounding at the end of the track end with it
+        for (_, pitch), started in active.items():
+            for onset, velocity in started:
+                self._add_note(state, onset, tick - onset, pitch, velocity, tpb)
+
+        melody.flush()
+        state['melodies'].append(melody)
+        state['end_tick'] = max(state['end_tick'], tick)
+
+    def _add_note(self, state, onset, duration, pitch, velocity, tpb):
+        state['pitch_counts'][pitch] += 1
+        state['pc_weights'][pitch % 12] += max(duration, 1)
+        state['velocity_sum'] += velocity
+        self._add_key_window(state, onset, max(duration, 1), pitch, tpb)
+
+        durations = state['durations']
+        if len(durations) < MAX_TRACKED_DURATIONS:
+            durations.add(round(duration * 12 / tpb))
+
+        # Mark the beats this note sounds in for chord recognition. Tracks are read one after
+        # another from tick 0, so beats cannot be finished while a track is read; instead the
+        # buffer grows with the song only up to MAX_BEATS and later beats are left out
+        first_beat = onset // tpb
+        if first_beat >= MAX_BEATS:
+            return
+        last_beat = min((onset + max(duration, 1) - 1) // tpb, MAX_BEATS - 1)
+        masks = state['beat_masks']
+        if last_beat >= len(masks):
+            masks = np.resize(masks, min(max(last_beat + 1, 2 * len(masks)), MAX_BEATS))
+            masks[state['beat_count']:] = 0
+            state['beat_masks'] = masks
+        masks[first_beat:last_beat + 1] |= 1 << (pitch % 12)
+        state['beat_count'] = max(state['beat_count'], last_beat + 1)
+
+    def _key_window_ticks(self, state, tpb):
+        """Ticks per key window under the opening time signature known so far"""
+        numerator, denominator = 4, 4
+        if state['time_signature']:
+            _, numerator, denominator = state['time_signature']
+        return tpb * numerator * 4 // denominator * self.key_window_measures
+
+    def _add_key_window(self, state, onset, weight, pitch, tpb):
+        """Add a note to the pitch-class histogram of its key window, up to MAX_BEATS"""
+        if state['key_window_ticks'] is None:
+            state['key_window_ticks'] = self._key_window_ticks(state, tpb)
+        # Tiny ticks_per_beat with short beat units can round a window to nothing, as in MIDIAnalyzer
+        if state['key_window_ticks'] <= 0 or onset // tpb >= MAX_BEATS:
+            return
+        window = onset // state['key_window_ticks']
+        histograms = state['key_histograms']
+        if window >= len(histograms):
+            grown = np.zeros((max(window + 1, 2 * len(histograms)), 12))
+            grown[:len(histograms)] = histograms
+            state['key_histograms'] = histograms = grown
+        histograms[window, pitch % 12] += weight
+        state['key_window_count'] = max(state['key_window_count'], window + 1)
+
+    def _summarize(self, state, midi_format, track_count, tpb):
+        """Turn the accumulators into the same analysis layout and chord timeline as MIDIAnalyzer"""
+        pitch_counts = state['pitch_counts']
+        total_notes = int(pitch_counts.sum())
+        sounding = np.flatnonzero(pitch_counts)
+
+        numerator, denominator = 4, 4
+        if state['time_signature']:
+            _, numerator, denominator = state['time_signature']
+        measure_ticks = tpb * numerator * 4 // denominator
+        total_measures = -(-state['end_tick'] // measure_ticks) if total_notes else 0
+
+        tempo_map = TempoMap(state['tempo_changes'], tpb)
+
+        pc_counts = np.bincount(np.arange(128) % 12, weights=pitch_counts, minlength=12)
+        ranked = np.argsort(-pc_counts, kind='stable')[:5]
+
+        key_info = {'key': 'C major', 'mode': 'major', 'confidence': 0, 'alternatives': []}
+        if total_notes:
+            key_info = detect_key_from_histogram(state['pc_weights'], self.key_profile)
+        key_info['sections'] = []
+        # Windows are fixed by the first note; a time signature that only turns up later
+        # (and changes the measure length) leaves the windows unaligned, so no sections then
+        if total_notes and state['key_window_ticks'] == self._key_window_ticks(state, tpb):
+            key_info['sections'] = self._describe_key_sections(key_sections_from_histograms(
+                state['key_histograms'][:state['key_window_count']], self.key_profile
+            ))
+
+        starts, _, chord_ids = chords_from_beat_masks(
+            state['beat_masks'][:state['beat_count']].astype(np.int64), tpb, numerator
+        )
+
+        analysis = {
+            'basic_info': {
+                'format': midi_format,
+                'tracks': track_count,
+                'ticks_per_beat': tpb,
+                'duration_ticks': state['end_tick'],
+                'length_seconds': tempo_map.tick_to_seconds(state['end_tick'])
+            },
+            'key_signature': key_info,
+            'tempo_info': self._describe_tempo(tempo_map, state['end_tick']),
+            'notes_analysis': {
+                'total_notes': total_notes,
+                'pitch_range': {
+                    'lowest': int(sounding[0]) if total_notes else 0,
+                    'highest': int(sounding[-1]) if total_notes else 0
+                },
+                'most_common_notes': [self.note_names[pc] for pc in ranked if pc_counts[pc] > 0],
+                'average_velocity': round(state['velocity_sum'] / total_notes) if total_notes else 0
+            },
+            'chord_progression': self._describe_chords(chord_ids, key_info),
+            'rhythm_patterns': {
+                'time_signature': f'{numerator}/{denominator}',
+                'rhythmic_complexity': self._classify_rhythm(len(state['durations'])),
+                'unique_durations': len(state['durations'])
+            },
+            'structure_analysis': self._describe_structure(total_measures),
+            'melodic_analysis': self._summarize_melody(state['melodies'])
+        }
+        return analysis, self._chord_timeline(starts // tpb, chord_ids)
+
+    def _summarize_melody(self, melodies):
+        """Melodic analysis of the track with the highest average pitch"""
+        candidates = [melody for melody in melodies if melody.count >= 2]
+        if not candidates:
+            return {'contour': 'Insufficient data', 'intervals': [], 'range': 0}
+
+        melody = max(candidates, key=lambda m: m.pitch_sum / m.count)
+        avg_interval = melody.interval_sum / (melody.count - 1)
+
+        return {
+            'contour': self._classify_contour(avg_interval),
+            'intervals': melody.first_intervals,
+            'range': melody.highest - melody.lowest,
+            'average_interval': round(avg_interval, 2)
+        }
@@ -0,0 +1,66 @@
+"""
+Tempo map with cumulative tick-to-seconds segments
+"""
+import numpy as np
+
+DEFAULT_TEMPO = 500000  # microseconds per beat (120 BPM)
+
+
+class TempoMap:
+    """Piecewise-constant tempo segments with O(log n) tick/second conversion"""
+
+    def __init__(self, tempo_changes, ticks_per_beat):
+        self.ticks_per_beat = ticks_per_beat
+
+        # Later changes at the same tick win; the song starts at 120 BPM until told otherwise
+        by_tick = {0: DEFAULT_TEMPO}
+        for tick, tempo in sorted(tempo_changes, key=lambda change: change[0]):
+            by_tick[tick] = tempo
+
+        ticks = sorted(by_tick)
+        self.ticks = np.array(ticks, dtype=np.int64)
+        self.tempos = np.array([by_tick[tick] for tick in ticks], dtype=np.int64)
+
+        # Seconds elapsed at the start of each segment
+        seconds_per_tick = self.tempos / (ticks_per_beat * 1e6)
+        segment_seconds = np.diff(self.ticks) * seconds_per_tick[:-1]
+        self.seconds = np.concatenate(([0.0], np.cumsum(segment_seconds)))
+        self._seconds_per_tick = seconds_per_tick
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def _segment(self, tick):
+        return np.searchsorted(self.ticks, tick, side='right') - 1
+
+    def tick_to_seconds(self, tick):
+        """Seconds at a tick (scalar or array)"""
+        segment = self._segment(tick)
+        seconds = self.seconds[segment] + (np.asarray(tick) - self.ticks[segment]) * self._seconds_per_tick[segment]
+        return float(seconds) if np.ndim(seconds) == 0 else seconds
+
+    def seconds_to_tick(self, seconds):
+        """Tick reached after the given number of seconds (scalar or array)"""
+        segment = np.searchsorted(self.seconds, seconds, side='right') - 1
+        ticks = self.ticks[segment] + (np.asarray(seconds) - self.seconds[segment]) / self._seconds_per_tick[segment]
+        ticks = np.rint(ticks).astype(np.int64)
+        return int(ticks) if np.ndim(ticks) == 0 else ticks
+
+    def bpm_at(self, tick):
+        return 60000000 / float(self.tempos[self._segment(tick)])
+
+    def average_bpm(self, end_tick):
+        """Time-weighted average BPM from the start to end_tick: beats played per minute"""
+        if end_tick <= 0:
+            return 60000000 / float(self.tempos[0])
+        return (end_tick / self.ticks_per_beat) / (self.tick_to_seconds(end_tick) / 60)
+
+    def bpm_range(self, end_tick):
+        """Lowest and highest BPM of the segments that start before end_tick"""
+        active = self.tempos[:max(self._segment(max(end_tick - 1, 0)) + 1, 1)]
+        return 60000000 / float(active.max()), 60000000 / float(active.min())
+
+    def change_count(self, end_tick):
+        """Number of real tempo changes (a new value, not a repeat) before end_tick"""
+        active = self.tempos[:max(self._segment(max(end_tick - 1, 0)) + 1, 1)]
+        return int(np.count_nonzero(active[1:] != active[:-1]))
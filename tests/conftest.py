@@ -0,0 +1,63 @@
+"""
+Shared helpers for the test suite: repo modules on the path and MIDI decoding through mido
+"""
+import io
+import os
+import sys
+
+import mido
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def decode(data):
+    """Parse SMF bytes with mido, independently of the repo's own reader"""
+    return mido.MidiFile(file=io.BytesIO(data))
+
+
+def absolute_messages(track):
+    """(absolute tick, message) for every message of a mido track"""
+    tick = 0
+    messages = []
+    for message in track:
+        tick += message.time
+        messages.append((tick, message))
+    return messages
+
+
+def track_end_tick(track):
+    """Absolute tick of a mido track's end-of-track event"""
+    return sum(message.time for message in track)
+
+
+def to_bytes(midi_file):
+    """Serialize a mido MidiFile"""
+    buffer = io.BytesIO()
+    midi_file.save(file=buffer)
+    return buffer.getvalue()
+
+
+def multi_tempo_midi(ticks_per_beat=480):
+    """
+    Type 1 file: a conductor track with a tempo change, and a legato line of whole notes
+    that stops half a bar before the conductor track ends
+    """
+    bar = 4 * ticks_per_beat
+    conductor = mido.MidiTrack([
+        mido.MetaMessage('time_signature', numerator=4, denominator=4, time=0),
+        mido.MetaMessage('set_tempo', tempo=500000, time=0),
+        mido.MetaMessage('set_tempo', tempo=300000, time=3 * bar),
+        mido.MetaMessage('end_of_track', time=5 * bar),
+    ])
+    melody = mido.MidiTrack([mido.Message('program_change', program=0, time=0)])
+    for pitch in (60, 64, 67, 65, 62, 64, 60):
+        melody.append(mido.Message('note_on', note=pitch, velocity=90, time=0))
+        melody.append(mido.Message('note_off', note=pitch, velocity=0, time=bar))
+    melody.append(mido.Message('note_on', note=72, velocity=90, time=0))
+    melody.append(mido.Message('note_off', note=72, velocity=0, time=bar // 2))
+    melody.append(mido.MetaMessage('end_of_track', time=0))
+
+    midi_file = mido.MidiFile(type=1, ticks_per_beat=ticks_per_beat)
+    midi_file.tracks.extend([conductor, melody])
+    return to_bytes(midi_file)
@@ -0,0 +1,24 @@
+"""
+Accompaniment defaults when the analysis leaves out the key's mode or chords
+"""
+import pytest
+
+from accompaniment import QUALITY_INDEX, Accompaniment
+from pattern_library import PatternLibrary
+
+
+@pytest.mark.parametrize('key_info', [{'key': 'D major'}, {'key': 'D major', 'mode': 'lydian-ish'}])
+def test_missing_or_unknown_mode_defaults_to_major(key_info):
+    accompaniment = Accompaniment({'key_signature': key_info}, 480, PatternLibrary())
+
+    assert accompaniment.mode == 'major'
+    # With no chord timeline every tick falls back to the D major tonic triad
+    assert accompaniment.default_chord == QUALITY_INDEX['major'] * 12 + 2
+    assert list(accompaniment.chords_at([0, 4800])) == [accompaniment.default_chord] * 2
+
+
+def test_minor_mode_is_kept():
+    accompaniment = Accompaniment({'key_signature': {'key': 'A minor', 'mode': 'minor'}}, 480, PatternLibrary())
+
+    assert accompaniment.mode == 'minor'
+    assert accompaniment.default_chord == QUALITY_INDEX['minor'] * 12 + 9
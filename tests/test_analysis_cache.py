@@ -0,0 +1,28 @@
+"""
+AnalysisCache disk tier: entries survive a new cache instance, and the directory stays within its byte budget
+"""
+import os
+import time
+
+from analysis_cache import AnalysisCache
+
+
+def test_disk_tier_is_shared_across_instances(tmp_path):
+    AnalysisCache(cache_dir=str(tmp_path)).put('key', {'value': 1})
+
+    assert AnalysisCache(cache_dir=str(tmp_path)).get('key') == {'value': 1}
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = AnalysisCache(max_entries=0, cache_dir=str(tmp_path), max_disk_bytes=250)
+    payload = {'data': 'x' * 80}
+
+    for index, key in enumerate(['a', 'b']):
+        cache.put(key, payload)
+        # Distinct modification times, oldest first
+        os.utime(tmp_path / f'{key}.json', (time.time() - 10 + index, time.time() - 10 + index))
+    cache.get('a')
+    cache.put('c', payload)
+
+    assert sorted(os.listdir(tmp_path)) == ['a.json', 'c.json']
+    assert cache.stats()['disk_evictions'] == 1
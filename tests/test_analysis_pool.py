@@ -0,0 +1,29 @@
+"""
+AnalysisPool worker handling: a task that outlives the timeout is stopped, and the pool keeps serving
+"""
+import multiprocessing
+import time
+
+from analysis_pool import AnalysisPool
+
+
+def test_timed_out_worker_is_terminated():
+    pool = AnalysisPool(processes=1, timeout=3)
+    try:
+        start = time.perf_counter()
+        result = pool.run(time.sleep, 600)
+        assert result == {'success': False, 'error': 'Analysis timed out after 3 seconds'}
+
+        # The sleeping worker does not keep its process (or its slot) after the timeout
+        deadline = time.perf_counter() + 10
+        while multiprocessing.active_children() and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        assert not multiprocessing.active_children()
+        assert time.perf_counter() - start < 15
+
+        # A fresh pool takes the next job
+        assert pool.run(abs, -4) == 4
+    finally:
+        pool.shutdown(wait=False)
+        for process in multiprocessing.active_children():
+            process.terminate()
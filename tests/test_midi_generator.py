@@ -0,0 +1,128 @@
+"""
+Improved MIDI decoded with mido: extended lengths, cuts inside held notes, seeded output and chord following
+"""
+import mido
+import pytest
+
+from conftest import absolute_messages, decode, multi_tempo_midi, to_bytes, track_end_tick
+from midi_analyzer import MIDIAnalyzer
+from midi_generator import MAX_DURATION_MULTIPLIER, MIDIGenerator
+
+BAR = 4 * 480
+SONG_TICKS = 8 * BAR
+# The conductor track sets the song's length; the melody stops half a bar earlier
+TRACK_ENDS = [SONG_TICKS, SONG_TICKS - BAR // 2]
+# Three bars at 120 bpm, then five at 200 bpm
+SONG_SECONDS = 3 * 4 * 0.5 + 5 * 4 * 0.3
+
+ALL_PARTS = {
+    'goals': ['harmony', 'rhythm', 'melody', 'arrangement'],
+    'instruments': ['bass', 'drums', 'chords', 'strings', 'lead', 'pad'],
+    'target_genre': 'pop',
+}
+
+
+@pytest.fixture(scope='module')
+def song():
+    data = multi_tempo_midi()
+    return data, MIDIAnalyzer().analyze_data(data)
+
+
+def improve(song, seed=0, **preferences):
+    data, result = song
+    output = MIDIGenerator().apply_suggestions(
+        data, result['analysis'], {}, {**ALL_PARTS, **preferences}, seed=seed, chord_timeline=result['chord_timeline']
+    )
+    assert output is not None
+    return decode(output)
+
+
+def notes_of(track):
+    return [message.note for _, message in absolute_messages(track) if message.type == 'note_on' and message.velocity]
+
+
+@pytest.mark.parametrize('option, passes', [('extend_2x', 2), ('extend_4x', 4)])
+def test_whole_pass_extension(song, option, passes):
+    midi_file = improve(song, improvement_duration=option)
+    original = decode(song[0])
+
+    # Original tracks repeat every song length and end where they did in the last pass;
+    # added parts never run past the end of the song
+    assert [track_end_tick(track) for track in midi_file.tracks[:2]] == [(passes - 1) * SONG_TICKS + end for end in TRACK_ENDS]
+    assert all(track_end_tick(track) <= passes * SONG_TICKS for track in midi_file.tracks[2:])
+    assert len(midi_file.tracks) == 2 + len(ALL_PARTS['instruments'])
+
+    assert notes_of(midi_file.tracks[1]) == notes_of(original.tracks[1]) * passes
+    assert midi_file.length == pytest.approx(passes * SONG_SECONDS)
+
+
+def test_fractional_custom_duration_follows_the_tempo_map(song):
+    midi_file = improve(song, improvement_duration='custom', custom_duration=2.4 * SONG_SECONDS)
+
+    # 0.4 of the song is 4.8 s: two bars of 2 s at 120 bpm, then 1.6 more beats of 0.5 s
+    target_tick = 2 * SONG_TICKS + int(2.4 * BAR)
+    assert [track_end_tick(track) for track in midi_file.tracks[:2]] == [target_tick] * 2
+    assert midi_file.length == pytest.approx(2.4 * SONG_SECONDS, abs=1e-3)
+
+
+def test_partial_cut_releases_held_notes(song):
+    midi_file = improve(song, improvement_duration='custom', custom_duration=2.4 * SONG_SECONDS)
+    target_tick = 2 * SONG_TICKS + int(2.4 * BAR)
+
+    sounding = set()
+    notes_off = []
+    for tick, message in absolute_messages(midi_file.tracks[1]):
+        if message.type == 'note_on' and message.velocity:
+            sounding.add((message.channel, message.note))
+        elif message.type in ('note_on', 'note_off'):
+            sounding.discard((message.channel, message.note))
+        elif message.type == 'control_change' and message.control == 123:
+            notes_off.append((tick, message.channel))
+            sounding = {note for note in sounding if note[0] != message.channel}
+
+    # The third pass is cut inside the whole note on G, which all-notes-off releases
+    assert notes_off == [(target_tick, 0)]
+    assert not sounding
+
+
+def test_custom_duration_is_capped(song):
+    midi_file = improve(song, improvement_duration='custom', custom_duration=1e9)
+
+    assert track_end_tick(midi_file.tracks[0]) == MAX_DURATION_MULTIPLIER * SONG_TICKS
+
+
+def test_same_seed_gives_identical_bytes(song):
+    data, result = song
+    preferences = {**ALL_PARTS, 'improvement_duration': 'custom', 'custom_duration': 2.4 * SONG_SECONDS}
+
+    def generate(seed):
+        return MIDIGenerator().apply_suggestions(
+            data, result['analysis'], {}, preferences, seed=seed, chord_timeline=result['chord_timeline']
+        )
+
+    first = generate(7)
+    assert generate(7) == first
+    assert generate(8) != first
+
+
+def test_parts_follow_the_chord_timeline():
+    # One bar each of C, F, G and C major triads
+    track = mido.MidiTrack()
+    for root in (60, 65, 67, 60):
+        chord = (root, root + 4, root + 7)
+        track.extend(mido.Message('note_on', note=pitch, velocity=80, time=0) for pitch in chord)
+        track.extend(mido.Message('note_off', note=pitch, velocity=0, time=BAR if pitch == root else 0) for pitch in chord)
+    midi_file = mido.MidiFile(type=0, ticks_per_beat=480)
+    midi_file.tracks.append(track)
+    result = MIDIAnalyzer().analyze_data(to_bytes(midi_file))
+
+    # The timeline stays out of the public analysis but still drives the bass
+    assert 'timeline' not in result['analysis']['chord_progression']
+    assert result['chord_timeline']['beats'] == [0, 4, 8, 12]
+    output = decode(MIDIGenerator().apply_suggestions(
+        to_bytes(midi_file), result['analysis'], {}, {**ALL_PARTS, 'improvement_duration': 'original', 'instruments': ['bass']},
+        chord_timeline=result['chord_timeline']
+    ))
+    bar_starts = {tick: message.note % 12 for tick, message in absolute_messages(output.tracks[1])
+                  if message.type == 'note_on' and message.velocity and tick % BAR == 0}
+    assert [bar_starts[bar * BAR] for bar in range(4)] == [0, 5, 7, 0]
@@ -0,0 +1,31 @@
+"""
+MusicTheoryHelper public methods return plain, caller-owned lists and dicts built from the shared tables
+"""
+import json
+
+from music_theory import MusicTheoryHelper
+
+
+def test_suggest_next_chords_returns_fresh_dicts():
+    helper = MusicTheoryHelper()
+    suggestions = helper.suggest_next_chords('C major', 'C')
+
+    assert isinstance(suggestions, list) and suggestions
+    assert all(type(suggestion) is dict for suggestion in suggestions)
+    json.dumps(suggestions)
+
+    # Mutating the result leaves the shared table alone
+    suggestions[0]['chord'] = 'changed'
+    suggestions.append({})
+    assert helper.suggest_next_chords('C major', 'C') == helper.suggest_next_chords('C major', 'C')
+    assert helper.suggest_next_chords('C major', 'C')[0]['chord'] != 'changed'
+
+
+def test_get_scale_notes_returns_a_list():
+    helper = MusicTheoryHelper()
+    notes = helper.get_scale_notes('A', 'minor')
+
+    assert notes == ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+    notes.append('G#')
+    assert helper.get_scale_notes('A', 'minor') == ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+    assert helper.get_scale_notes('H') == []
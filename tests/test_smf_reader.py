@@ -0,0 +1,57 @@
+"""
+smf_reader against mido: chunk boundaries, event offsets and timing of the same bytes
+"""
+import io
+import struct
+
+import pytest
+
+import smf_reader
+from conftest import decode, multi_tempo_midi, track_end_tick
+
+
+def test_track_chunks_are_the_raw_mtrk_chunks():
+    data = multi_tempo_midi()
+    chunks = [bytes(chunk) for chunk in smf_reader.iter_track_chunks(data)]
+
+    assert len(chunks) == len(decode(data).tracks)
+    assert b''.join(chunks) == data[14:]
+    # Each chunk is a file of its own once given a header
+    for chunk, track in zip(chunks, decode(data).tracks):
+        header = b'MThd' + struct.pack('>LHHH', 6, 0, 1, 480)
+        assert decode(header + chunk).tracks[0] == track
+
+
+def test_track_chunks_skip_unknown_chunks():
+    data = multi_tempo_midi()
+    alien = b'XFIH' + struct.pack('>L', 3) + b'abc'
+    spliced = data[:14] + alien + data[14:]
+
+    assert [bytes(chunk) for chunk in smf_reader.iter_track_chunks(spliced)] == \
+        [bytes(chunk) for chunk in smf_reader.iter_track_chunks(data)]
+
+
+def test_truncated_track_chunk_raises():
+    with pytest.raises(EOFError):
+        list(smf_reader.iter_track_chunks(multi_tempo_midi()[:-5]))
+
+
+def test_event_offsets_point_at_each_event():
+    track_data = bytes(list(smf_reader.iter_track_chunks(multi_tempo_midi()))[1])[8:]
+    events = list(smf_reader.iter_event_offsets(track_data))
+
+    assert events[0][0] == 0
+    # Cutting the track at an event's offset leaves exactly the events before it
+    for count, (offset, _, _, _) in enumerate(events):
+        assert list(smf_reader.iter_event_offsets(track_data[:offset])) == events[:count]
+
+
+def test_read_timing_matches_mido():
+    data = multi_tempo_midi()
+    midi_file = decode(data)
+
+    ticks_per_beat, tempo_changes, track_end_ticks = smf_reader.read_timing(io.BytesIO(data))
+
+    assert ticks_per_beat == midi_file.ticks_per_beat
+    assert tempo_changes == [(0, 500000), (3 * 4 * 480, 300000)]
+    assert track_end_ticks == [track_end_tick(track) for track in midi_file.tracks]
@@ -0,0 +1,81 @@
+"""
+smf_writer output decoded with mido: events, running status and delta-times survive the round trip
+"""
+import numpy as np
+import pytest
+
+import smf_writer
+from conftest import absolute_messages, decode
+
+
+def channel_events(track):
+    """(tick, status, data1, data2) of the channel messages of a mido track, note-offs as note-on velocity 0"""
+    events = []
+    for tick, message in absolute_messages(track):
+        if message.type in ('note_on', 'note_off'):
+            velocity = message.velocity if message.type == 'note_on' else 0
+            events.append((tick, 0x90 | message.channel, message.note, velocity))
+        elif message.type == 'control_change':
+            events.append((tick, 0xB0 | message.channel, message.control, message.value))
+        elif message.type == 'program_change':
+            events.append((tick, 0xC0 | message.channel, message.program, 0))
+    return events
+
+
+def expected_events(events):
+    """Events in the order encode_events writes them"""
+    events = events[np.lexsort((smf_writer._event_order(events), events['tick']))]
+    return [tuple(int(value) for value in event) for event in events]
+
+
+def test_notes_round_trip_with_running_status():
+    rng = np.random.default_rng(0)
+    onsets = np.sort(rng.integers(0, 20000, 500))
+    events = np.concatenate([
+        smf_writer.program_change(0, 33),
+        smf_writer.note_events(onsets, rng.integers(1, 960, 500), rng.integers(0, 128, 500), rng.integers(1, 128, 500), 0),
+        smf_writer.note_events(onsets[::3], 240, 36, 100, 9),
+    ])
+
+    data = smf_writer.encode_events(events)
+    midi_file = decode(smf_writer.write_file([smf_writer.track_chunk(data)], 480))
+
+    assert channel_events(midi_file.tracks[0]) == expected_events(events)
+    # Running status leaves most status bytes out
+    assert len(data) < 4 * len(events)
+
+
+def test_large_deltas_round_trip():
+    # Each delta needs one more varlen byte than the last, up to the four-byte maximum
+    ticks = np.cumsum([0, 0x7F, 0x3FFF, 0x1FFFFF, smf_writer.MAX_DELTA])
+    events = np.zeros(len(ticks), dtype=smf_writer.EVENT_DTYPE)
+    events['tick'] = ticks
+    events['status'] = 0xB3
+    events['data1'] = 7
+    events['data2'] = np.arange(len(ticks))
+
+    midi_file = decode(smf_writer.write_file([smf_writer.encode_track(events)], 96))
+
+    assert channel_events(midi_file.tracks[0]) == expected_events(events)
+
+
+def test_delta_beyond_varlen_range_is_rejected():
+    # The note-off at tick 1 leaves a gap of MAX_DELTA + 1 before the second note
+    events = smf_writer.note_events([0, smf_writer.MAX_DELTA + 2], 1, 60, 100, 0)
+    with pytest.raises(ValueError):
+        smf_writer.encode_events(events)
+
+
+@pytest.mark.parametrize('value', [0, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, smf_writer.MAX_DELTA])
+def test_varlen_matches_mido(value):
+    from mido.midifiles.midifiles import encode_variable_int
+    assert smf_writer.encode_varlen(value) == bytes(encode_variable_int(value))
+
+
+def test_end_of_track_delta():
+    chunk = smf_writer.track_chunk(smf_writer.encode_events(smf_writer.note_events([0], 100, 60, 100, 0)), end_delta=500)
+    midi_file = decode(smf_writer.write_file([chunk], 480))
+
+    end = absolute_messages(midi_file.tracks[0])[-1]
+    assert end[1].type == 'end_of_track'
+    assert end[0] == 600
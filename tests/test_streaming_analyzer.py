@@ -0,0 +1,55 @@
+"""
+StreamingAnalyzer against MIDIAnalyzer on the same bytes, and its bounds on pathological files
+"""
+import io
+import struct
+
+import mido
+
+import smf_reader
+import smf_writer
+from conftest import multi_tempo_midi, to_bytes
+from midi_analyzer import MIDIAnalyzer
+from streaming_analyzer import MAX_TRACKED_TEMPO_CHANGES, StreamingAnalyzer
+
+
+def modulating_midi():
+    """Eight bars of 3/4 C major triads, then eight of F# major, so the windowed keys differ"""
+    track = mido.MidiTrack([mido.MetaMessage('time_signature', numerator=3, denominator=4, time=0)])
+    for root in [60] * 8 + [66] * 8:
+        chord = (root, root + 4, root + 7)
+        track.extend(mido.Message('note_on', note=pitch, velocity=80, time=0) for pitch in chord)
+        track.extend(mido.Message('note_off', note=pitch, velocity=0, time=3 * 480 if pitch == root else 0)
+                     for pitch in chord)
+    midi_file = mido.MidiFile(type=0, ticks_per_beat=480)
+    midi_file.tracks.append(track)
+    return to_bytes(midi_file)
+
+
+def test_key_sections_tempo_and_chords_match_midi_analyzer():
+    for data in (multi_tempo_midi(), modulating_midi()):
+        streamed = StreamingAnalyzer().analyze_data(data)
+        decoded = MIDIAnalyzer().analyze_data(data)
+
+        assert streamed['analysis']['key_signature']['sections'] == decoded['analysis']['key_signature']['sections']
+        assert streamed['analysis']['tempo_info'] == decoded['analysis']['tempo_info']
+        assert streamed['chord_timeline'] == decoded['chord_timeline']
+
+    assert [section['key'] for section in decoded['analysis']['key_signature']['sections']] == ['C major', 'F# major']
+
+
+def test_tempo_changes_are_capped():
+    # A track of nothing but tempo events, alternating so every one is a real change
+    body = b''.join(b'\x01\xff\x51\x03' + (500000 + 1000 * (i % 2)).to_bytes(3, 'big')
+                    for i in range(2 * MAX_TRACKED_TEMPO_CHANGES))
+    data = b'MThd' + struct.pack('>LHHH', 6, 0, 1, 480) + smf_writer.track_chunk(body)
+
+    analyzer = StreamingAnalyzer()
+    state = analyzer._new_state()
+    fp = io.BytesIO(data)
+    smf_reader.read_header(fp)
+    for _, length in smf_reader.iter_tracks(fp):
+        analyzer._consume_track(state, fp, length, 480)
+
+    assert len(state['tempo_changes']) == MAX_TRACKED_TEMPO_CHANGES
+    assert analyzer.analyze_data(data)['success']
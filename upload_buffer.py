@@ -0,0 +1,70 @@
+"""
+Uploads kept in memory for the whole pipeline, spooled to a temporary file only when large
+"""
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from flask import Request, current_app
+
+DEFAULT_SPOOL_THRESHOLD = 16 * 1024 * 1024
+
+
+class SpoolingRequest(Request):
+    """Request whose uploaded files stay in memory up to UPLOAD_SPOOL_THRESHOLD bytes"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_size = current_app.config.get('UPLOAD_SPOOL_THRESHOLD', DEFAULT_SPOOL_THRESHOLD)
+        return tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+
+
+class Upload:
+    """An uploaded file's buffer, size and content digest, owned by whoever processes it"""
+
+    def __init__(self, buffer, block_size=1024 * 1024):
+        self.buffer = buffer
+
+        digest = hashlib.sha256()
+        self.buffer.seek(0)
+        for block in iter(lambda: self.buffer.read(block_size), b''):
+            digest.update(block)
+        self.size = self.buffer.tell()
+        self.digest = digest.hexdigest()
+
+    @classmethod
+    def from_file_storage(cls, file_storage):
+        """Take a request file's buffer over, so it outlives the request (which closes its files)"""
+        buffer = file_storage.stream
+        file_storage.stream = io.BytesIO()
+        return cls(buffer)
+
+    @classmethod
+    def from_stream(cls, stream, max_size=DEFAULT_SPOOL_THRESHOLD):
+        """Copy a readable stream (such as a zip member) into a buffer spooled like request uploads"""
+        buffer = tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+        shutil.copyfileobj(stream, buffer)
+        return cls(buffer)
+
+    def stream(self):
+        """The buffer, rewound to the start"""
+        self.buffer.seek(0)
+        return self.buffer
+
+    def read(self):
+        """The whole upload as bytes"""
+        return self.stream().read()
+
+    @contextlib.contextmanager
+    def temporary_path(self):
+        """Path of a copy of the upload on disk, for readers in other processes; removed on exit"""
+        with tempfile.NamedTemporaryFile(suffix='.mid', delete=False) as f:
+            shutil.copyfileobj(self.stream(), f)
+        try:
+            yield f.name
+        finally:
+            os.remove(f.name)
+
+    def close(self):
+        self.buffer.close()